@@ -0,0 +1,53 @@
+"""store meta text as binary for compression at rest
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 10:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Required by the models whatever TEXT_COMPRESSION is set to. Existing
+    # text is kept byte for byte and read as plain UTF-8, which is also what
+    # TEXT_COMPRESSION=none writes; backend.scripts.compress_text compresses it
+    op.alter_column('song_meta', 'lyrics',
+               existing_type=mysql.TEXT(),
+               type_=mysql.MEDIUMBLOB(),
+               existing_nullable=False)
+    op.alter_column('artist_meta', 'info',
+               existing_type=mysql.TEXT(),
+               type_=mysql.MEDIUMBLOB(),
+               existing_nullable=False)
+    op.alter_column('album_meta', 'info',
+               existing_type=mysql.TEXT(),
+               type_=mysql.MEDIUMBLOB(),
+               existing_nullable=False)
+
+
+def downgrade() -> None:
+    # Run `python3 -m backend.scripts.compress_text --format none` first,
+    # otherwise compressed rows are not readable as text
+    op.alter_column('album_meta', 'info',
+               existing_type=mysql.MEDIUMBLOB(),
+               type_=mysql.TEXT(),
+               existing_nullable=False)
+    op.alter_column('artist_meta', 'info',
+               existing_type=mysql.MEDIUMBLOB(),
+               type_=mysql.TEXT(),
+               existing_nullable=False)
+    op.alter_column('song_meta', 'lyrics',
+               existing_type=mysql.MEDIUMBLOB(),
+               type_=mysql.TEXT(),
+               existing_nullable=False)
@@ -0,0 +1,40 @@
+"""add keyset indexes for sorted comment listings
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 14:02:11.530871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_song_comments_song_id_num_like', 'song_comments', ['song_id', 'num_like', 'id'], unique=False)
+    op.create_index('ix_song_comments_song_id_created', 'song_comments', ['song_id', 'created', 'id'], unique=False)
+    op.create_index('ix_song_comments_song_id_star', 'song_comments', ['song_id', 'star', 'id'], unique=False)
+    op.create_index('ix_artist_comments_artist_id_num_like', 'artist_comments', ['artist_id', 'num_like', 'id'], unique=False)
+    op.create_index('ix_artist_comments_artist_id_created', 'artist_comments', ['artist_id', 'created', 'id'], unique=False)
+    op.create_index('ix_album_comments_album_id_num_like', 'album_comments', ['album_id', 'num_like', 'id'], unique=False)
+    op.create_index('ix_album_comments_album_id_created', 'album_comments', ['album_id', 'created', 'id'], unique=False)
+    op.create_index('ix_album_comments_album_id_star', 'album_comments', ['album_id', 'star', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_album_comments_album_id_star', table_name='album_comments')
+    op.drop_index('ix_album_comments_album_id_created', table_name='album_comments')
+    op.drop_index('ix_album_comments_album_id_num_like', table_name='album_comments')
+    op.drop_index('ix_artist_comments_artist_id_created', table_name='artist_comments')
+    op.drop_index('ix_artist_comments_artist_id_num_like', table_name='artist_comments')
+    op.drop_index('ix_song_comments_song_id_star', table_name='song_comments')
+    op.drop_index('ix_song_comments_song_id_created', table_name='song_comments')
+    op.drop_index('ix_song_comments_song_id_num_like', table_name='song_comments')
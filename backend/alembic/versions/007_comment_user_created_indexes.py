@@ -0,0 +1,30 @@
+"""add (user_id, created) indexes for the user activity feed
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 14:41:37.204519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_song_comments_user_id_created', 'song_comments', ['user_id', 'created', 'id'], unique=False)
+    op.create_index('ix_artist_comments_user_id_created', 'artist_comments', ['user_id', 'created', 'id'], unique=False)
+    op.create_index('ix_album_comments_user_id_created', 'album_comments', ['user_id', 'created', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_album_comments_user_id_created', table_name='album_comments')
+    op.drop_index('ix_artist_comments_user_id_created', table_name='artist_comments')
+    op.drop_index('ix_song_comments_user_id_created', table_name='song_comments')
@@ -0,0 +1,32 @@
+"""add comment likes table
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 16:05:12.384920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '009'
+down_revision: Union[str, None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('comment_likes',
+    sa.Column('comment_type', sa.String(length=10), nullable=False),
+    sa.Column('comment_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('comment_type', 'comment_id', 'user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('comment_likes')
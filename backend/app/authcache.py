@@ -0,0 +1,99 @@
+"""
+Cache of verified access tokens and the users they belong to.
+
+`get_current_user` decodes and verifies a JWT, then looks the user up in the
+database, on every authenticated request. Entries here are keyed by the
+token's signature segment and hold the decoded claims and a `schemas.User`
+record. An entry is used only for the identical token string, and it
+expires after AUTH_CACHE_TTL seconds or at the token's `exp`, whichever
+comes first. The cache is a bounded LRU of AUTH_CACHE_SIZE entries.
+
+`invalidate_user` drops every cached token of a user. It must be called
+whenever a user record changes. The cache is per process, so other workers
+see the change once their entries expire (after at most AUTH_CACHE_TTL
+seconds).
+"""
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+
+class TokenCache:
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # signature -> (token, expires at (epoch seconds), claims, user)
+        self._entries: "OrderedDict[str, Tuple[str, float, dict, object]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _signature(token: str) -> str:
+        return token.rpartition(".")[2]
+
+    def get(self, token: str) -> Optional[Tuple[dict, object]]:
+        """Return (claims, user) for a previously verified token, or None."""
+        signature = self._signature(token)
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is None:
+                self.misses += 1
+                return None
+            cached_token, expires_at, claims, user = entry
+            if not hmac.compare_digest(cached_token, token):
+                self.misses += 1
+                return None
+            if expires_at <= time.time():
+                self.misses += 1
+                self._remove(signature)
+                return None
+            self.hits += 1
+            self._entries.move_to_end(signature)
+            return claims, user
+
+    def put(self, token: str, claims: dict, user) -> None:
+        """Cache a verified token's claims (including `sub`, the user name) and user record."""
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        signature = self._signature(token)
+        with self._lock:
+            self._remove(signature)
+            self._entries[signature] = (token, expires_at, claims, user)
+            self._by_user.setdefault(claims["sub"], set()).add(signature)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_name: str) -> None:
+        with self._lock:
+            for signature in list(self._by_user.get(user_name, ())):
+                self._remove(signature)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _remove(self, signature: str) -> None:
+        entry = self._entries.pop(signature, None)
+        if entry is None:
+            return
+        user_name = entry[2].get("sub")
+        signatures = self._by_user.get(user_name)
+        if signatures is not None:
+            signatures.discard(signature)
+            if not signatures:
+                del self._by_user[user_name]
+
+
+token_cache = TokenCache()
@@ -0,0 +1,565 @@
+"""
+Read-only in-memory snapshot of the catalog (genres, artists, albums, songs).
+
+Enabled with CATALOG_SNAPSHOT=true. Each table is held column by column:
+string columns as lists of interned strings, integer and date columns as
+`array` buffers (dates as ordinals, 0 for NULL). External ids are interned
+to dense integer row numbers, and the album -> songs, artist -> albums and
+genre -> artists/albums adjacency is precomputed as arrays of row numbers.
+Responses are materialized as plain dicts only for the rows a route returns.
+
+create_* functions in crud call `note_change`, which queues the changed
+row on the snapshot; the next read applies just the changed rows. Reads and
+applying changes hold the snapshot's lock, so readers never see a row half
+written.
+
+Every catalog write also bumps the shared version row (`bump_version`, in
+the writer's transaction). Reads compare it with the snapshot's version at
+most every CATALOG_SNAPSHOT_CHECK_INTERVAL seconds; a version this process
+did not write means another worker changed the catalog, and the snapshot is
+reloaded. Writes that bypass crud (e.g. scripts/load_data.py) are picked up
+by a full reload every CATALOG_SNAPSHOT_MAX_AGE seconds. Reloads run in a
+background thread and requests keep reading the old snapshot until the new
+one is ready.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import insort
+from collections import defaultdict
+from datetime import date
+from functools import partial, wraps
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session, undefer
+
+from . import models
+from .schemas import GENRE_SUMMARY_LENGTH
+
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "False").lower() == "true"
+CATALOG_SNAPSHOT_MAX_AGE = float(os.getenv("CATALOG_SNAPSHOT_MAX_AGE", "300"))
+CATALOG_SNAPSHOT_CHECK_INTERVAL = float(os.getenv("CATALOG_SNAPSHOT_CHECK_INTERVAL", "1"))
+
+# Seconds to wait before retrying a failed background reload
+_RELOAD_RETRY_DELAY = 30.0
+
+_NO_ROW = -1
+_NO_DATE = 0
+
+logger = logging.getLogger(__name__)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _to_ordinal(value: Optional[date]) -> int:
+    return value.toordinal() if value is not None else _NO_DATE
+
+
+def _from_ordinal(value: int) -> Optional[date]:
+    return date.fromordinal(value) if value != _NO_DATE else None
+
+
+class _Table:
+    """Column-oriented rows with external ids interned to row numbers."""
+    __slots__ = ("columns", "keys", "index", "sorted_keys")
+
+    def __init__(self, int_columns, str_columns):
+        self.columns = {name: array("i") for name in int_columns}
+        self.columns.update({name: [] for name in str_columns})
+        self.keys = []
+        self.index = {}
+        # Keys in primary key order, the order the database lists rows in
+        self.sorted_keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def upsert(self, key, values: dict) -> int:
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            for name, column in self.columns.items():
+                column.append(values[name])
+            self.keys.append(key)
+            self.index[key] = row
+            insort(self.sorted_keys, key)
+        else:
+            for name, column in self.columns.items():
+                column[row] = values[name]
+        return row
+
+    def page(self, skip: int, limit: int) -> List[int]:
+        return [self.index[key] for key in self.sorted_keys[skip:skip + limit]]
+
+
+class _Adjacency:
+    """Row number -> array of related row numbers."""
+    __slots__ = ("edges",)
+
+    def __init__(self):
+        self.edges: Dict[int, array] = defaultdict(lambda: array("i"))
+
+    def insert(self, source: int, target: int, key) -> None:
+        """Add a target the source isn't related to yet, keeping the array sorted by `key`."""
+        insort(self.edges[source], target, key=key)
+
+    def extend(self, source: int, targets: Iterable[int]) -> None:
+        """Append the targets the source isn't already related to."""
+        edges = self.edges[source]
+        existing = set(edges)
+        for target in targets:
+            if target not in existing:
+                existing.add(target)
+                edges.append(target)
+
+    def remove(self, source: int, target: int) -> None:
+        targets = self.edges.get(source)
+        if targets is not None:
+            _remove_row(targets, target)
+
+    def get(self, source: int) -> array:
+        return self.edges.get(source, array("i"))
+
+
+def _locked(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self.genres = _Table(["id"], ["name", "info"])
+        self.artists = _Table([], ["artist_id", "name", "region"])
+        self.albums = _Table(
+            ["artist_row", "release_date", "listen_date"],
+            ["album_id", "name", "artist_id", "album_lan", "album_category", "record_label"]
+        )
+        self.songs = _Table(["order", "album_row"], ["song_id", "name", "album_id"])
+
+        self.album_songs = _Adjacency()
+        self.artist_albums = _Adjacency()
+        self.genre_artists = _Adjacency()
+        self.genre_albums = _Adjacency()
+        self.artists_by_region: Dict[str, List[int]] = defaultdict(list)
+        self.albums_by_language: Dict[str, List[int]] = defaultdict(list)
+
+        # Parent key -> rows whose parent isn't in the snapshot yet, linked when it arrives
+        self.albums_without_artist: Dict[str, set] = defaultdict(set)
+        self.songs_without_album: Dict[str, set] = defaultdict(set)
+
+        # Rows changed since they were last read, filled by note_change under the module lock
+        self.pending: Dict[type, set] = defaultdict(set)
+        # Shared catalog version the rows were loaded at, and versions this process wrote since
+        self.version = 0
+        self.own_versions: set = set()
+        self.loaded_at = self.checked_at = time.monotonic()
+        # Reentrant so _refresh can hold it from taking the changes until they are applied
+        self._lock = threading.RLock()
+
+    # Loading
+    def load(self, db: Session) -> None:
+        # Read first: a write committed while the rows load shows up as a newer version
+        self.version = read_version(db)
+        for genre in db.query(models.Genre).options(undefer(models.Genre.info)).order_by(models.Genre.id):
+            self._upsert_genre(genre)
+        for artist in db.query(models.Artist).order_by(models.Artist.artist_id):
+            self._upsert_artist(artist)
+        for album in db.query(models.Album).order_by(models.Album.album_id):
+            self._upsert_album(album)
+        for song in db.query(models.Song).order_by(models.Song.song_id):
+            self._upsert_song(song)
+        self._load_genre_links(db)
+
+    @_locked
+    def apply_changes(self, db: Session, changes: Dict[type, set]) -> None:
+        """Reload only the changed rows, parents before children."""
+        for model, upsert, options in ((models.Genre, self._upsert_genre, [undefer(models.Genre.info)]),
+                                       (models.Artist, self._upsert_artist, []),
+                                       (models.Album, self._upsert_album, []),
+                                       (models.Song, self._upsert_song, [])):
+            keys = changes.get(model)
+            if not keys:
+                continue
+            key_column = model.__mapper__.primary_key[0]
+            for row in db.query(model).options(*options).filter(key_column.in_(list(keys))):
+                upsert(row)
+        artist_ids = changes.get(models.Artist)
+        album_ids = changes.get(models.Album)
+        if artist_ids or album_ids:
+            self._load_genre_links(db, artist_ids=artist_ids, album_ids=album_ids)
+
+    def _load_genre_links(self, db: Session, artist_ids=None, album_ids=None) -> None:
+        artist_links = db.query(models.artist_genre_link.c.artist_id, models.artist_genre_link.c.genre_id)
+        album_links = db.query(models.album_genre_link.c.album_id, models.album_genre_link.c.genre_id)
+        if artist_ids is not None or album_ids is not None:
+            artist_links = artist_links.filter(models.artist_genre_link.c.artist_id.in_(list(artist_ids or [])))
+            album_links = album_links.filter(models.album_genre_link.c.album_id.in_(list(album_ids or [])))
+        for links, table, adjacency in ((artist_links, self.artists, self.genre_artists),
+                                        (album_links, self.albums, self.genre_albums)):
+            targets_by_genre = defaultdict(list)
+            for target_id, genre_id in links:
+                genre_row = self.genres.index.get(genre_id)
+                target_row = table.index.get(target_id)
+                if genre_row is not None and target_row is not None:
+                    targets_by_genre[genre_row].append(target_row)
+            for genre_row, targets in targets_by_genre.items():
+                adjacency.extend(genre_row, targets)
+
+    def _upsert_genre(self, genre: models.Genre) -> None:
+        self.genres.upsert(genre.id, {"id": genre.id, "name": _intern(genre.name), "info": genre.info})
+
+    def _upsert_artist(self, artist: models.Artist) -> None:
+        row = self.artists.index.get(artist.artist_id)
+        if row is not None:
+            _remove_row(self.artists_by_region[self.artists.columns["region"][row]], row)
+        row = self.artists.upsert(artist.artist_id, {
+            "artist_id": _intern(artist.artist_id),
+            "name": artist.name,
+            "region": _intern(artist.region)
+        })
+        _insert_sorted(self.artists_by_region[_intern(artist.region)], row, self._artist_key)
+        for album_row in self.albums_without_artist.pop(artist.artist_id, ()):
+            self.albums.columns["artist_row"][album_row] = row
+            self.artist_albums.insert(row, album_row, self._album_key)
+
+    def _upsert_album(self, album: models.Album) -> None:
+        albums = self.albums
+        row = albums.index.get(album.album_id)
+        if row is not None:
+            self.artist_albums.remove(albums.columns["artist_row"][row], row)
+            self.albums_without_artist[albums.columns["artist_id"][row]].discard(row)
+            _remove_row(self.albums_by_language[albums.columns["album_lan"][row]], row)
+        artist_row = self.artists.index.get(album.artist_id, _NO_ROW)
+        row = albums.upsert(album.album_id, {
+            "album_id": _intern(album.album_id),
+            "name": album.name,
+            "artist_id": _intern(album.artist_id),
+            "artist_row": artist_row,
+            "album_lan": _intern(album.album_lan),
+            "release_date": _to_ordinal(album.release_date),
+            "album_category": _intern(album.album_category),
+            "record_label": _intern(album.record_label),
+            "listen_date": _to_ordinal(album.listen_date)
+        })
+        if artist_row != _NO_ROW:
+            self.artist_albums.insert(artist_row, row, self._album_key)
+        else:
+            self.albums_without_artist[album.artist_id].add(row)
+        _insert_sorted(self.albums_by_language[_intern(album.album_lan)], row, self._album_key)
+        for song_row in self.songs_without_album.pop(album.album_id, ()):
+            self.songs.columns["album_row"][song_row] = row
+            self.album_songs.insert(row, song_row, self.songs.columns["order"].__getitem__)
+
+    def _upsert_song(self, song: models.Song) -> None:
+        songs = self.songs
+        row = songs.index.get(song.song_id)
+        if row is not None:
+            self.album_songs.remove(songs.columns["album_row"][row], row)
+            self.songs_without_album[songs.columns["album_id"][row]].discard(row)
+        album_row = self.albums.index.get(song.album_id, _NO_ROW)
+        row = songs.upsert(song.song_id, {
+            "song_id": _intern(song.song_id),
+            "name": song.name,
+            "order": song.order,
+            "album_id": _intern(song.album_id),
+            "album_row": album_row
+        })
+        if album_row != _NO_ROW:
+            self.album_songs.insert(album_row, row, songs.columns["order"].__getitem__)
+        else:
+            self.songs_without_album[song.album_id].add(row)
+
+    def _artist_key(self, row: int):
+        return self.artists.keys[row]
+
+    def _album_key(self, row: int):
+        return self.albums.keys[row]
+
+    # Row materialization
+    def _genre(self, row: int) -> dict:
+        columns = self.genres.columns
+        return {"id": columns["id"][row], "name": columns["name"][row], "info": columns["info"][row]}
+
+    def _artist(self, row: int) -> dict:
+        columns = self.artists.columns
+        return {"artist_id": columns["artist_id"][row], "name": columns["name"][row], "region": columns["region"][row]}
+
+    def _album(self, row: int) -> dict:
+        columns = self.albums.columns
+        return {
+            "album_id": columns["album_id"][row],
+            "name": columns["name"][row],
+            "artist_id": columns["artist_id"][row],
+            "album_lan": columns["album_lan"][row],
+            "release_date": _from_ordinal(columns["release_date"][row]),
+            "album_category": columns["album_category"][row],
+            "record_label": columns["record_label"][row],
+            "listen_date": _from_ordinal(columns["listen_date"][row])
+        }
+
+    def _song(self, row: int) -> dict:
+        columns = self.songs.columns
+        return {
+            "song_id": columns["song_id"][row],
+            "name": columns["name"][row],
+            "order": columns["order"][row],
+            "album_id": columns["album_id"][row]
+        }
+
+    # Reads, mirroring the crud functions they replace
+    @_locked
+    def get_genres(self, skip: int = 0, limit: int = 100):
+        columns = self.genres.columns
+        info = columns["info"]
+        # None stays None, as SUBSTR(NULL) does on the database path
+        return [
+            {"id": columns["id"][row], "name": columns["name"][row],
+             "summary": info[row] and info[row][:GENRE_SUMMARY_LENGTH]}
+            for row in self.genres.page(skip, limit)
+        ]
+
+    @_locked
+    def get_genre(self, genre_id: int):
+        row = self.genres.index.get(genre_id)
+        return self._genre(row) if row is not None else None
+
+    @_locked
+    def get_artists_by_genre(self, genre_id: int, skip: int = 0, limit: int = 100):
+        row = self.genres.index.get(genre_id)
+        if row is None:
+            return []
+        return [self._artist(r) for r in self.genre_artists.get(row)[skip:skip + limit]]
+
+    @_locked
+    def get_albums_by_genre(self, genre_id: int, skip: int = 0, limit: int = 100):
+        row = self.genres.index.get(genre_id)
+        if row is None:
+            return []
+        return [self._album(r) for r in self.genre_albums.get(row)[skip:skip + limit]]
+
+    @_locked
+    def get_artists(self, skip: int = 0, limit: int = 100):
+        return [self._artist(row) for row in self.artists.page(skip, limit)]
+
+    @_locked
+    def get_artists_by_region(self, region: str, skip: int = 0, limit: int = 100):
+        return [self._artist(row) for row in self.artists_by_region.get(region, [])[skip:skip + limit]]
+
+    @_locked
+    def get_artist(self, artist_id: str):
+        row = self.artists.index.get(artist_id)
+        return self._artist(row) if row is not None else None
+
+    @_locked
+    def get_albums_by_artist(self, artist_id: str, skip: int = 0, limit: int = 100):
+        row = self.artists.index.get(artist_id)
+        if row is None:
+            return []
+        return [self._album(r) for r in self.artist_albums.get(row)[skip:skip + limit]]
+
+    @_locked
+    def get_albums(self, skip: int = 0, limit: int = 100):
+        return [self._album(row) for row in self.albums.page(skip, limit)]
+
+    @_locked
+    def get_albums_by_language(self, album_lan: str, skip: int = 0, limit: int = 100):
+        return [self._album(row) for row in self.albums_by_language.get(album_lan, [])[skip:skip + limit]]
+
+    @_locked
+    def get_album(self, album_id: str):
+        row = self.albums.index.get(album_id)
+        return self._album(row) if row is not None else None
+
+    @_locked
+    def get_songs_by_album(self, album_id: str, skip: int = 0, limit: int = 100):
+        row = self.albums.index.get(album_id)
+        if row is None:
+            return []
+        return [self._song(r) for r in self.album_songs.get(row)[skip:skip + limit]]
+
+    @_locked
+    def get_songs(self, skip: int = 0, limit: int = 100):
+        return [self._song(row) for row in self.songs.page(skip, limit)]
+
+    @_locked
+    def get_song(self, song_id: str):
+        row = self.songs.index.get(song_id)
+        return self._song(row) if row is not None else None
+
+
+def _insert_sorted(rows: List[int], row: int, key) -> None:
+    insort(rows, row, key=key)
+
+
+def _remove_row(rows, row: int) -> None:
+    if row in rows:
+        rows.remove(row)
+
+
+# Snapshot lifecycle
+_lock = threading.Lock()
+_snapshot: Optional[CatalogSnapshot] = None
+# Snapshot being loaded; it gets the changes noted while it loads
+_loading: Optional[CatalogSnapshot] = None
+# Held while a snapshot is loaded, so only one load runs at a time
+_load_lock = threading.Lock()
+
+
+def read_version(db: Session) -> int:
+    """Current shared catalog version."""
+    version = db.query(models.CatalogVersion.version).filter(models.CatalogVersion.id == 1).scalar()
+    return version or 0
+
+
+def bump_version(db: Session) -> Optional[int]:
+    """
+    Increment the shared catalog version in the caller's transaction and return it.
+
+    Called by crud before committing a catalog write; the row lock keeps the
+    version ours until the commit. Returns None when the snapshot is disabled.
+    """
+    if not CATALOG_SNAPSHOT:
+        return None
+    table = models.CatalogVersion.__table__
+    result = db.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        db.execute(insert(table).values(id=1, version=1))
+    return read_version(db)
+
+
+def note_change(model, key, version: Optional[int] = None) -> None:
+    """
+    Record a created/changed catalog row; called by the crud create_* functions
+    after committing, with the version `bump_version` returned for the write.
+    """
+    if not CATALOG_SNAPSHOT:
+        return
+    with _lock:
+        for snapshot in (_snapshot, _loading):
+            if snapshot is not None:
+                snapshot.pending[model].add(key)
+                if version is not None:
+                    snapshot.own_versions.add(version)
+
+
+def _load(db: Session) -> CatalogSnapshot:
+    global _snapshot, _loading
+    snapshot = CatalogSnapshot()
+    with _lock:
+        _loading = snapshot
+    try:
+        snapshot.load(db)
+    finally:
+        with _lock:
+            _loading = None
+    with _lock:
+        _snapshot = snapshot
+    return snapshot
+
+
+def load(db: Session) -> CatalogSnapshot:
+    """Build a fresh snapshot and make it current."""
+    with _load_lock:
+        return _load(db)
+
+
+def _reload_in_background(db: Session, stale: CatalogSnapshot) -> None:
+    """Start loading a new snapshot on the request's engine, unless a load is already running."""
+    if not _load_lock.acquire(blocking=False):
+        return
+    bind = db.get_bind()
+
+    def run():
+        session = Session(bind=bind)
+        try:
+            _load(session)
+        except Exception:
+            logger.exception("Catalog snapshot reload failed; retrying in %s seconds", _RELOAD_RETRY_DELAY)
+            stale.loaded_at = time.monotonic()
+            stale.checked_at = time.monotonic() + _RELOAD_RETRY_DELAY
+        finally:
+            session.close()
+            _load_lock.release()
+
+    threading.Thread(target=run, name="catalog-snapshot-reload", daemon=True).start()
+
+
+def _written_elsewhere(db: Session, snapshot: CatalogSnapshot) -> bool:
+    """Whether the shared version moved past the snapshot's by writes this process didn't make."""
+    snapshot.checked_at = time.monotonic()
+    version = read_version(db)
+    with _lock:
+        if version <= snapshot.version:
+            return False
+        # More new versions than writes of ours: some came from another process
+        if version - snapshot.version > len(snapshot.own_versions):
+            return True
+        if not snapshot.own_versions.issuperset(range(snapshot.version + 1, version + 1)):
+            return True
+        snapshot.own_versions = {v for v in snapshot.own_versions if v > version}
+        snapshot.version = version
+        return False
+
+
+def _refresh(db: Session, snapshot: CatalogSnapshot) -> None:
+    """Apply the changes noted for this snapshot since it was last read."""
+    with snapshot._lock:
+        with _lock:
+            changes, snapshot.pending = snapshot.pending, defaultdict(set)
+        if changes:
+            snapshot.apply_changes(db, changes)
+
+
+def active_snapshot(db: Session) -> Optional[CatalogSnapshot]:
+    """
+    Return the current snapshot brought up to date, or None when the snapshot is disabled.
+
+    Only the very first load runs in the request. A snapshot older than
+    CATALOG_SNAPSHOT_MAX_AGE, or behind another process's writes, is still
+    returned while its replacement loads.
+    """
+    if not CATALOG_SNAPSHOT:
+        return None
+    snapshot = _snapshot
+    if snapshot is None:
+        with _load_lock:
+            snapshot = _snapshot or _load(db)
+    else:
+        now = time.monotonic()
+        if now - snapshot.loaded_at > CATALOG_SNAPSHOT_MAX_AGE:
+            _reload_in_background(db, snapshot)
+        elif now - snapshot.checked_at > CATALOG_SNAPSHOT_CHECK_INTERVAL and _written_elsewhere(db, snapshot):
+            _reload_in_background(db, snapshot)
+    if snapshot.pending:
+        _refresh(db, snapshot)
+    return snapshot
+
+
+class _DatabaseReader:
+    """Forwards snapshot-style reads to the same-named crud functions."""
+    __slots__ = ("db",)
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def __getattr__(self, name):
+        # Imported here because crud imports this module for note_change
+        from . import crud
+        return partial(getattr(crud, name), self.db)
+
+
+def reader(db: Session):
+    """Catalog reads from the snapshot when it is enabled, otherwise from the database."""
+    snapshot = active_snapshot(db)
+    if snapshot is not None:
+        return snapshot
+    return _DatabaseReader(db)
@@ -1,14 +1,399 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer
+from sqlalchemy import bindparam, func, insert, literal, tuple_, type_coerce, update, LargeBinary
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
+from datetime import date, datetime, timedelta
 from . import models
 from . import schemas
-from .utils import get_password_hash, verify_password
-import math
+from . import catalog
+from . import groupcommit
+from .loader import BATCH_CHUNK_SIZE, get_loader
+from .topcomments import top_comments, CACHED_SORTS
+from .passwords import hasher
+from .authcache import token_cache
+from .utils import (decode_cursor, encode_cursor, generate_refresh_nonce, key_normalizer, sign_refresh_token,
+                    REFRESH_TOKEN_EXPIRE_DAYS)
+import collections
+import heapq
+import hmac
+import itertools
+import re
+import time
+
+
+class DuplicateError(Exception):
+    """An insert was rejected by a primary key or unique constraint."""
+
+
+class MissingReferenceError(Exception):
+    """An insert was rejected by a foreign key constraint; `column` is the offending column when the driver reports it."""
+
+    def __init__(self, column: Optional[str] = None):
+        super().__init__(column)
+        self.column = column
+
+
+# MySQL error codes: duplicate entry, and child row with a missing parent
+_MYSQL_DUPLICATE = {1062}
+_MYSQL_MISSING_REFERENCE = {1216, 1452}
+_FOREIGN_KEY_COLUMN = re.compile(r"FOREIGN KEY \(`(\w+)`\)")
+
+
+def _constraint_error(error: IntegrityError) -> Exception:
+    """Translate an IntegrityError into DuplicateError/MissingReferenceError, or return it unchanged."""
+    args = getattr(error.orig, "args", ())
+    code = args[0] if args else None
+    message = str(error.orig)
+    if code in _MYSQL_DUPLICATE or "UNIQUE constraint failed" in message:
+        return DuplicateError(message)
+    if code in _MYSQL_MISSING_REFERENCE or "FOREIGN KEY constraint failed" in message:
+        match = _FOREIGN_KEY_COLUMN.search(message)
+        return MissingReferenceError(match.group(1) if match else None)
+    return error
+
+
+def _insert_one(db: Session, model, values: dict, catalog_row: bool = False):
+    """
+    INSERT one row and commit, in a single statement plus the commit.
+
+    There is no existence pre-check and no refresh SELECT: constraint violations
+    are raised as DuplicateError/MissingReferenceError, an autoincrement key is
+    taken from the insert result, and every other server-side default has to be
+    filled in by the caller. Returns a transient instance of `model` built from
+    the inserted values.
+
+    A `catalog_row` bumps the shared catalog version in the same transaction
+    and is noted on the catalog snapshot.
+    """
+    try:
+        result = db.execute(insert(model.__table__).values(values))
+        version = catalog.bump_version(db) if catalog_row else None
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise _constraint_error(e) from e
+    key_column = model.__mapper__.primary_key[0]
+    if key_column.key not in values:
+        values[key_column.key] = result.inserted_primary_key[0]
+    get_loader(db).forget(model, values[key_column.key])
+    if catalog_row:
+        catalog.note_change(model, values[key_column.key], version)
+    return model(**values)
+
+
+def write_comment_batch(db: Session, items: List[tuple]) -> list:
+    """
+    Group-commit writer: insert (model, values) comment rows in one transaction.
+
+    Returns the new id of each row, or the DuplicateError/MissingReferenceError
+    for rows that violate a constraint. If any row fails, the transaction is
+    rolled back and the rows are replayed one commit each, so only the bad
+    rows are rejected.
+    """
+    try:
+        ids = [
+            db.execute(insert(model.__table__).values(values)).inserted_primary_key[0]
+            for model, values in items
+        ]
+        db.commit()
+        return ids
+    except IntegrityError:
+        db.rollback()
+
+    results = []
+    for model, values in items:
+        try:
+            results.append(_insert_one(db, model, dict(values)).id)
+        except (DuplicateError, MissingReferenceError) as e:
+            results.append(e)
+    return results
+
+
+def _create_comment(db: Session, model, values: dict):
+    """Insert a comment directly, or through the group-commit queue when it is running."""
+    values.update(_timestamps())
+    comment_queue = groupcommit.active_queue()
+    if comment_queue is None:
+        db_comment = _insert_one(db, model, values)
+    else:
+        values["id"] = comment_queue.submit((model, values))
+        db_comment = model(**values)
+    top_comments.invalidate(model, values[_COMMENT_ENTITY[model]])
+    return db_comment
+
+
+def _timestamps() -> dict:
+    """
+    `created`/`modified` for a new row, at the precision of the DATETIME columns.
+
+    Naive UTC, like the rest of crud: database.py pins the MySQL session
+    time zone to UTC, so these match the server's now() defaults.
+    """
+    now = datetime.utcnow().replace(microsecond=0)
+    return {"created": now, "modified": now}
+
+
+def _comment_columns(model):
+    """Column attributes of a comment model, for querying plain rows instead of tracked ORM instances."""
+    return [getattr(model, column.key) for column in model.__table__.columns]
+
+
+# Comment listing sorts: sort key columns and whether they run descending.
+# Each one is backed by an (entity id, *key columns) index from migration 006.
+COMMENT_SORTS = {
+    None: (("id",), False),
+    "-num_like": (("num_like", "id"), True),
+    "-created": (("created", "id"), True),
+    "star": (("star", "id"), False),
+    "-star": (("star", "id"), True),
+}
+
+# Artist comments have no required rating, so they can't be listed by star
+ARTIST_COMMENT_SORTS = {sort: key for sort, key in COMMENT_SORTS.items() if sort not in ("star", "-star")}
+ARTIST_COMMENT_SORT_DESCRIPTION = "-num_like (most liked) or -created (newest)"
+
+# Column holding the commented entity's id, per comment model
+_COMMENT_ENTITY = {
+    models.SongComment: "song_id",
+    models.ArtistComment: "artist_id",
+    models.AlbumComment: "album_id",
+}
+
+
+def _list_comments(db: Session, model, entity_id, skip: int = 0, limit: int = 100,
+                   sort: Optional[str] = None, cursor: Optional[str] = None,
+                   sorts: dict = COMMENT_SORTS):
+    """
+    One page of an entity's comments in `sort` order, as plain rows.
+
+    Paging is by keyset `cursor` (the `next_cursor` of the previous page);
+    `skip` is still honoured when no cursor is given. First pages of the
+    most-liked and newest views are served from the top comments cache.
+    Raises ValueError for an unknown sort or a malformed cursor.
+    """
+    if sort not in sorts:
+        raise ValueError("Unknown sort")
+    key_names, descending = sorts[sort]
+    key_columns = [getattr(model, name) for name in key_names]
+
+    def load(n, after=None):
+        query = db.query(*_comment_columns(model)).filter(getattr(model, _COMMENT_ENTITY[model]) == entity_id)
+        if after is not None:
+            key = tuple_(*key_columns)
+            after = tuple_(*after, types=[column.type for column in key_columns])
+            query = query.filter(key < after if descending else key > after)
+        elif skip:
+            query = query.offset(skip)
+        order = [column.desc() for column in key_columns] if descending else key_columns
+        return query.order_by(*order).limit(n).all()
+
+    if cursor is not None:
+        after = decode_cursor(cursor, [column.type.python_type for column in key_columns])
+        rows = load(limit + 1, after)
+        has_more = len(rows) > limit
+    elif sort in CACHED_SORTS and not skip and limit <= top_comments.size:
+        rows, has_more = top_comments.get_or_load((model, entity_id, sort), load)
+        has_more = has_more or len(rows) > limit
+    else:
+        rows = load(limit + 1)
+        has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor([getattr(rows[-1], name) for name in key_names])
+    return {"comments": rows, "next_cursor": next_cursor}
+
+
+# Multi-get operations
+def _get_many(db: Session, model, ids: List[str]):
+    """
+    Fetch rows by primary key through the request loader (chunked IN queries).
+
+    Returns the found rows in input order (duplicates dropped) and the list of missing ids.
+    """
+    ids = list(dict.fromkeys(ids))
+    rows = get_loader(db).load_many(model, ids)
+    found = [row for row in rows if row is not None]
+    missing = [i for i, row in zip(ids, rows) if row is None]
+    return found, missing
+
+
+def get_songs_by_ids(db: Session, song_ids: List[str]):
+    songs, missing = _get_many(db, models.Song, song_ids)
+    return {"songs": songs, "missing": missing}
+
+
+def get_albums_by_ids(db: Session, album_ids: List[str]):
+    albums, missing = _get_many(db, models.Album, album_ids)
+    return {"albums": albums, "missing": missing}
+
+
+def get_artists_by_ids(db: Session, artist_ids: List[str]):
+    artists, missing = _get_many(db, models.Artist, artist_ids)
+    return {"artists": artists, "missing": missing}
+
+
+# Bulk create operations
+def _existing_keys(db: Session, column, keys) -> set:
+    """Subset of `keys` present in `column`, checked with chunked IN queries."""
+    keys = list(set(keys))
+    found = set()
+    for start in range(0, len(keys), BATCH_CHUNK_SIZE):
+        chunk = keys[start:start + BATCH_CHUNK_SIZE]
+        found.update(value for (value,) in db.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def _existing_pairs(db: Session, first_column, second_column, pairs) -> set:
+    """(first, second) pairs present in a link table for the first values of `pairs`."""
+    found = set()
+    firsts = list({first for first, _ in pairs})
+    for start in range(0, len(firsts), BATCH_CHUNK_SIZE):
+        chunk = firsts[start:start + BATCH_CHUNK_SIZE]
+        found.update(tuple(pair) for pair in db.query(first_column, second_column).filter(first_column.in_(chunk)))
+    return found
+
+
+def _bulk_insert(db: Session, target, items: List[dict], key, existing: set, references, changed=None):
+    """
+    Insert the valid `items` with one executemany in a single transaction.
+
+    `key` maps an item to its identity; items whose identity is in `existing`
+    or repeated in the batch are duplicates. `references` is a list of
+    (field, known values, detail) foreign key checks. `changed` is an optional
+    (catalog model, field) pair: the write then bumps the shared catalog
+    version and each created item's field is noted on the catalog snapshot.
+    Returns per-item status.
+
+    Keys are compared the way the database collation compares them, so "ABC"
+    next to a stored "abc" is a duplicate on MySQL. If the insert still hits
+    a constraint (e.g. a concurrent insert of the same key), the transaction
+    is rolled back and the rows are replayed one commit each, so only the
+    offending items are rejected.
+    """
+    normalize = key_normalizer(db) or (lambda value: value)
+
+    def normalized(identity):
+        return tuple(map(normalize, identity)) if isinstance(identity, tuple) else normalize(identity)
+
+    seen = {normalized(identity) for identity in existing}
+    references = [(field, {normalize(value) for value in known}, detail) for field, known, detail in references]
+    pending = []
+    results = []
+    for index, item in enumerate(items):
+        identity = key(item)
+        result = {"index": index, "id": ":".join(map(str, identity)) if isinstance(identity, tuple) else str(identity)}
+        missing = [detail for field, known, detail in references if normalize(item[field]) not in known]
+        if normalized(identity) in seen:
+            result.update(status="duplicate", detail="Already exists")
+        elif missing:
+            result.update(status="missing_reference", detail="; ".join(missing))
+        else:
+            seen.add(normalized(identity))
+            pending.append((item, result))
+            result.update(status="created")
+        results.append(result)
+
+    if not pending:
+        return {"created": 0, "items": results}
+    details = {field: detail for field, _, detail in references}
+    try:
+        created = _insert_rows(db, target, [item for item, _ in pending], changed)
+    except IntegrityError:
+        db.rollback()
+        created = []
+        for item, result in pending:
+            try:
+                created.extend(_insert_rows(db, target, [item], changed))
+            except IntegrityError as e:
+                db.rollback()
+                error = _constraint_error(e)
+                if isinstance(error, DuplicateError):
+                    result.update(status="duplicate", detail="Already exists")
+                elif isinstance(error, MissingReferenceError):
+                    result.update(status="missing_reference",
+                                  detail=details.get(error.column, "Referenced row not found"))
+                else:
+                    raise error
+    return {"created": len(created), "items": results}
+
+
+def _insert_rows(db: Session, target, rows: List[dict], changed) -> List[dict]:
+    """Insert `rows` with one executemany and commit; see `_bulk_insert` for `changed`."""
+    db.execute(insert(target), rows)
+    version = catalog.bump_version(db) if changed else None
+    db.commit()
+    if changed:
+        model, field = changed
+        for row in rows:
+            catalog.note_change(model, row[field], version)
+    return rows
+
+
+def bulk_create_albums(db: Session, albums: List[schemas.AlbumCreate]):
+    items = [album.model_dump() for album in albums]
+    existing = _existing_keys(db, models.Album.album_id, [item["album_id"] for item in items])
+    artists = _existing_keys(db, models.Artist.artist_id, [item["artist_id"] for item in items])
+    return _bulk_insert(db, models.Album, items, lambda item: item["album_id"], existing,
+                        [("artist_id", artists, "Artist not found")], changed=(models.Album, "album_id"))
+
+
+def bulk_create_songs(db: Session, songs: List[schemas.SongCreate]):
+    items = [song.model_dump() for song in songs]
+    existing = _existing_keys(db, models.Song.song_id, [item["song_id"] for item in items])
+    albums = _existing_keys(db, models.Album.album_id, [item["album_id"] for item in items])
+    return _bulk_insert(db, models.Song, items, lambda item: item["song_id"], existing,
+                        [("album_id", albums, "Album not found")], changed=(models.Song, "song_id"))
+
+
+def bulk_create_song_meta(db: Session, metas: List[schemas.SongMetaCreate]):
+    items = [meta.model_dump() for meta in metas]
+    song_ids = [item["song_id"] for item in items]
+    existing = _existing_keys(db, models.SongMeta.song_id, song_ids)
+    songs = _existing_keys(db, models.Song.song_id, song_ids)
+    return _bulk_insert(db, models.SongMeta, items, lambda item: item["song_id"], existing,
+                        [("song_id", songs, "Song not found")])
+
+
+def bulk_create_song_artist_links(db: Session, links: List[schemas.SongArtistLinkCreate]):
+    items = [link.model_dump() for link in links]
+    pairs = [(item["song_id"], item["artist_id"]) for item in items]
+    table = models.song_artist_link
+    existing = _existing_pairs(db, table.c.song_id, table.c.artist_id, pairs)
+    songs = _existing_keys(db, models.Song.song_id, [song_id for song_id, _ in pairs])
+    artists = _existing_keys(db, models.Artist.artist_id, [artist_id for _, artist_id in pairs])
+    return _bulk_insert(db, table, items, lambda item: (item["song_id"], item["artist_id"]), existing,
+                        [("song_id", songs, "Song not found"), ("artist_id", artists, "Artist not found")])
+
+
+def bulk_create_album_genre_links(db: Session, links: List[schemas.AlbumGenreLinkCreate]):
+    items = [link.model_dump() for link in links]
+    pairs = [(item["album_id"], item["genre_id"]) for item in items]
+    table = models.album_genre_link
+    existing = _existing_pairs(db, table.c.album_id, table.c.genre_id, pairs)
+    albums = _existing_keys(db, models.Album.album_id, [album_id for album_id, _ in pairs])
+    genres = _existing_keys(db, models.Genre.id, [genre_id for _, genre_id in pairs])
+    return _bulk_insert(db, table, items, lambda item: (item["album_id"], item["genre_id"]), existing,
+                        [("album_id", albums, "Album not found"), ("genre_id", genres, "Genre not found")],
+                        changed=(models.Album, "album_id"))
+
+
+def bulk_create_artist_genre_links(db: Session, links: List[schemas.ArtistGenreLinkCreate]):
+    items = [link.model_dump() for link in links]
+    pairs = [(item["artist_id"], item["genre_id"]) for item in items]
+    table = models.artist_genre_link
+    existing = _existing_pairs(db, table.c.artist_id, table.c.genre_id, pairs)
+    artists = _existing_keys(db, models.Artist.artist_id, [artist_id for artist_id, _ in pairs])
+    genres = _existing_keys(db, models.Genre.id, [genre_id for _, genre_id in pairs])
+    return _bulk_insert(db, table, items, lambda item: (item["artist_id"], item["genre_id"]), existing,
+                        [("artist_id", artists, "Artist not found"), ("genre_id", genres, "Genre not found")],
+                        changed=(models.Artist, "artist_id"))
 
 
 # Genre operations
 def get_genre(db: Session, genre_id: int):
-    return db.query(models.Genre).filter(models.Genre.id == genre_id).first()
+    return get_loader(db).load(models.Genre, genre_id, undefer(models.Genre.info))
 
 
 def get_genre_by_name(db: Session, name: str):
@@ -16,20 +401,21 @@ def get_genre_by_name(db: Session, name: str):
 
 
 def get_genres(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Genre).offset(skip).limit(limit).all()
+    """List genres with a short excerpt of `info` instead of the full text."""
+    return db.query(
+        models.Genre.id,
+        models.Genre.name,
+        func.substr(models.Genre.info, 1, schemas.GENRE_SUMMARY_LENGTH).label("summary")
+    ).offset(skip).limit(limit).all()
 
 
 def create_genre(db: Session, genre: schemas.GenreCreate):
-    db_genre = models.Genre(name=genre.name, info=genre.info)
-    db.add(db_genre)
-    db.commit()
-    db.refresh(db_genre)
-    return db_genre
+    return _insert_one(db, models.Genre, {"name": genre.name, "info": genre.info}, catalog_row=True)
 
 
 def get_artists_by_genre(db: Session, genre_id: int, skip: int = 0, limit: int = 100):
-    # Get the genre
-    genre = db.query(models.Genre).filter(models.Genre.id == genre_id).first()
+    # Get the genre (memoized if the handler already checked it)
+    genre = get_genre(db, genre_id=genre_id)
     if not genre:
         return []
 
@@ -38,8 +424,8 @@ def get_artists_by_genre(db: Session, genre_id: int, skip: int = 0, limit: int =
 
 
 def get_albums_by_genre(db: Session, genre_id: int, skip: int = 0, limit: int = 100):
-    # Get the genre
-    genre = db.query(models.Genre).filter(models.Genre.id == genre_id).first()
+    # Get the genre (memoized if the handler already checked it)
+    genre = get_genre(db, genre_id=genre_id)
     if not genre:
         return []
 
@@ -49,7 +435,7 @@ def get_albums_by_genre(db: Session, genre_id: int, skip: int = 0, limit: int =
 
 # Artist operations
 def get_artist(db: Session, artist_id: str):
-    return db.query(models.Artist).filter(models.Artist.artist_id == artist_id).first()
+    return get_loader(db).load(models.Artist, artist_id)
 
 
 def get_artist_by_name(db: Session, name: str):
@@ -65,11 +451,11 @@ def get_artists(db: Session, skip: int = 0, limit: int = 100):
 
 
 def create_artist(db: Session, artist: schemas.ArtistCreate):
-    db_artist = models.Artist(artist_id=artist.artist_id, name=artist.name, region=artist.region)
-    db.add(db_artist)
-    db.commit()
-    db.refresh(db_artist)
-    return db_artist
+    return _insert_one(db, models.Artist, {
+        "artist_id": artist.artist_id,
+        "name": artist.name,
+        "region": artist.region
+    }, catalog_row=True)
 
 
 def get_artists_by_region(db: Session, region: str, skip: int = 0, limit: int = 100):
@@ -78,7 +464,7 @@ def get_artists_by_region(db: Session, region: str, skip: int = 0, limit: int =
 
 # Album operations
 def get_album(db: Session, album_id: str):
-    return db.query(models.Album).filter(models.Album.album_id == album_id).first()
+    return get_loader(db).load(models.Album, album_id)
 
 
 def get_album_by_name(db: Session, name: str):
@@ -98,20 +484,16 @@ def get_albums_by_artist(db: Session, artist_id: str, skip: int = 0, limit: int
 
 
 def create_album(db: Session, album: schemas.AlbumCreate):
-    db_album = models.Album(
-        album_id=album.album_id,
-        name=album.name,
-        artist_id=album.artist_id,
-        album_lan=album.album_lan,
-        release_date=album.release_date,
-        album_category=album.album_category,
-        record_label=album.record_label,
-        listen_date=album.listen_date
-    )
-    db.add(db_album)
-    db.commit()
-    db.refresh(db_album)
-    return db_album
+    return _insert_one(db, models.Album, {
+        "album_id": album.album_id,
+        "name": album.name,
+        "artist_id": album.artist_id,
+        "album_lan": album.album_lan,
+        "release_date": album.release_date,
+        "album_category": album.album_category,
+        "record_label": album.record_label,
+        "listen_date": album.listen_date
+    }, catalog_row=True)
 
 
 def get_albums_by_language(db: Session, album_lan: str, skip: int = 0, limit: int = 100):
@@ -120,7 +502,7 @@ def get_albums_by_language(db: Session, album_lan: str, skip: int = 0, limit: in
 
 # Song operations
 def get_song(db: Session, song_id: str):
-    return db.query(models.Song).filter(models.Song.song_id == song_id).first()
+    return get_loader(db).load(models.Song, song_id)
 
 
 def get_song_by_name(db: Session, name: str):
@@ -139,67 +521,128 @@ def get_songs_by_album(db: Session, album_id: str, skip: int = 0, limit: int = 1
     return db.query(models.Song).filter(models.Song.album_id == album_id).order_by(models.Song.order).offset(skip).limit(limit).all()
 
 
+def get_songs_by_artist(db: Session, artist_id: str, cursor: Optional[str] = None, limit: int = 100,
+                        sort: Optional[str] = None):
+    """
+    Keyset-paginated songs of an artist through song_artist_link, featured appearances included.
+
+    `sort` is None (by song id), "release_date" or "-release_date" (by album release date).
+    Raises ValueError for an unknown sort or a malformed cursor.
+    """
+    if sort is None:
+        sort_columns = [models.Song.song_id]
+        cursor_types = [str]
+    elif sort in ("release_date", "-release_date"):
+        sort_columns = [models.Album.release_date, models.Album.album_id, models.Song.order, models.Song.song_id]
+        cursor_types = [date, str, int, str]
+    else:
+        raise ValueError("Unknown sort")
+    descending = sort == "-release_date"
+
+    query = db.query(
+        models.Song.song_id,
+        models.Song.name,
+        models.Song.order,
+        models.Song.album_id,
+        models.Album.name.label("album_name"),
+        models.Album.release_date,
+        (models.Album.artist_id != artist_id).label("featured")
+    ).join(
+        models.song_artist_link, models.song_artist_link.c.song_id == models.Song.song_id
+    ).join(
+        models.Album, models.Album.album_id == models.Song.album_id
+    ).filter(models.song_artist_link.c.artist_id == artist_id)
+
+    if cursor is not None:
+        after = decode_cursor(cursor, cursor_types)
+        key = tuple_(*sort_columns)
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+
+    order = [column.desc() for column in sort_columns] if descending else sort_columns
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort is None:
+            next_cursor = encode_cursor([last.song_id])
+        else:
+            next_cursor = encode_cursor([last.release_date, last.album_id, last.order, last.song_id])
+    return {"songs": rows, "next_cursor": next_cursor}
+
+
 def create_song(db: Session, song: schemas.SongCreate):
-    db_song = models.Song(
-        song_id=song.song_id,
-        name=song.name,
-        order=song.order,
-        album_id=song.album_id
-    )
-    db.add(db_song)
-    db.commit()
-    db.refresh(db_song)
-    return db_song
+    return _insert_one(db, models.Song, {
+        "song_id": song.song_id,
+        "name": song.name,
+        "order": song.order,
+        "album_id": song.album_id
+    }, catalog_row=True)
 
 
 # Meta operations
 def get_song_meta(db: Session, song_id: str):
-    return db.query(models.SongMeta).filter(models.SongMeta.song_id == song_id).first()
+    return get_loader(db).load(models.SongMeta, song_id, undefer(models.SongMeta.lyrics))
+
+
+def get_song_meta_stored(db: Session, song_id: str):
+    """Meta row with `lyrics` left in its stored (possibly compressed) form."""
+    return db.query(
+        models.SongMeta.song_id,
+        type_coerce(models.SongMeta.lyrics, LargeBinary).label("lyrics")
+    ).filter(models.SongMeta.song_id == song_id).first()
 
 
 def create_song_meta(db: Session, meta: schemas.SongMetaCreate):
-    db_meta = models.SongMeta(song_id=meta.song_id, lyrics=meta.lyrics)
-    db.add(db_meta)
-    db.commit()
-    db.refresh(db_meta)
-    return db_meta
+    return _insert_one(db, models.SongMeta, {"song_id": meta.song_id, "lyrics": meta.lyrics})
 
 
 def get_artist_meta(db: Session, artist_id: str):
-    return db.query(models.ArtistMeta).filter(models.ArtistMeta.artist_id == artist_id).first()
+    return get_loader(db).load(models.ArtistMeta, artist_id, undefer(models.ArtistMeta.info))
+
+
+def get_artist_meta_stored(db: Session, artist_id: str):
+    """Meta row with `info` left in its stored (possibly compressed) form."""
+    return db.query(
+        models.ArtistMeta.artist_id,
+        models.ArtistMeta.pic_address,
+        type_coerce(models.ArtistMeta.info, LargeBinary).label("info")
+    ).filter(models.ArtistMeta.artist_id == artist_id).first()
 
 
 def create_artist_meta(db: Session, meta: schemas.ArtistMetaCreate):
-    db_meta = models.ArtistMeta(
-        artist_id=meta.artist_id,
-        info=meta.info,
-        pic_address=meta.pic_address
-    )
-    db.add(db_meta)
-    db.commit()
-    db.refresh(db_meta)
-    return db_meta
+    return _insert_one(db, models.ArtistMeta, {
+        "artist_id": meta.artist_id,
+        "info": meta.info,
+        "pic_address": meta.pic_address
+    })
 
 
 def get_album_meta(db: Session, album_id: str):
-    return db.query(models.AlbumMeta).filter(models.AlbumMeta.album_id == album_id).first()
+    return get_loader(db).load(models.AlbumMeta, album_id, undefer(models.AlbumMeta.info))
+
+
+def get_album_meta_stored(db: Session, album_id: str):
+    """Meta row with `info` left in its stored (possibly compressed) form."""
+    return db.query(
+        models.AlbumMeta.album_id,
+        models.AlbumMeta.pic_address,
+        type_coerce(models.AlbumMeta.info, LargeBinary).label("info")
+    ).filter(models.AlbumMeta.album_id == album_id).first()
 
 
 def create_album_meta(db: Session, meta: schemas.AlbumMetaCreate):
-    db_meta = models.AlbumMeta(
-        album_id=meta.album_id,
-        info=meta.info,
-        pic_address=meta.pic_address
-    )
-    db.add(db_meta)
-    db.commit()
-    db.refresh(db_meta)
-    return db_meta
+    return _insert_one(db, models.AlbumMeta, {
+        "album_id": meta.album_id,
+        "info": meta.info,
+        "pic_address": meta.pic_address
+    })
 
 
 # User operations
 def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    return get_loader(db).load(models.User, user_id)
 
 
 def get_user_by_name(db: Session, user_name: str):
@@ -211,100 +654,393 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
 
 
 def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        user_name=user.user_name,
-        password=hashed_password,
-        location=user.location,
-        age=user.age,
-        gender=user.gender,
-        constellation=user.constellation,
-        play_count=user.play_count,
-        join_time=user.join_time
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    hashed_password = hasher.hash(user.password)
+    db_user = _insert_one(db, models.User, {
+        "user_name": user.user_name,
+        "password": hashed_password,
+        "location": user.location,
+        "age": user.age,
+        "gender": user.gender,
+        "constellation": user.constellation,
+        "play_count": user.play_count,
+        "join_time": user.join_time or date.today()
+    })
+    # Drop cached sessions of any earlier account with this name
+    token_cache.invalidate_user(db_user.user_name)
     return db_user
 
 
+def get_existing_user_names(db: Session, user_names: List[str]) -> set:
+    if not user_names:
+        return set()
+    rows = db.query(models.User.user_name).filter(models.User.user_name.in_(user_names)).all()
+    return {row.user_name for row in rows}
+
+
+def insert_users(db: Session, rows: List[dict]) -> List[str]:
+    """
+    Bulk import writer: insert ready-to-store user rows with one executemany and one commit.
+
+    Returns the names of the inserted users. If a row collides with an existing
+    user name, the chunk is rolled back and replayed one row at a time, and
+    the colliding rows are left out.
+    """
+    if not rows:
+        return []
+    try:
+        db.execute(insert(models.User.__table__), rows)
+        db.commit()
+        inserted = [row["user_name"] for row in rows]
+    except IntegrityError:
+        db.rollback()
+        inserted = []
+        for row in rows:
+            try:
+                _insert_one(db, models.User, dict(row))
+                inserted.append(row["user_name"])
+            except DuplicateError:
+                pass
+    for user_name in inserted:
+        token_cache.invalidate_user(user_name)
+    return inserted
+
+
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_name(db, username)
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not hasher.verify(password, user.password):
         return False
     return user
 
 
+# Refresh token operations
+# Expired logins are deleted on a password login at most this often (seconds)
+REFRESH_TOKEN_PURGE_INTERVAL = 3600
+_last_refresh_purge = 0.0
+
+
+def _refresh_token(token_id: int, generation: int, nonce: str) -> str:
+    """A refresh token: `<login id>.<generation>.<signature>`."""
+    return f"{token_id}.{generation}.{sign_refresh_token(token_id, generation, nonce)}"
+
+
+def _find_refresh_token(db: Session, token: str):
+    """
+    Primary-key lookup of a refresh token's login, checked against its signature.
+
+    Returns (row, generation of the token), or None if the token is unknown,
+    malformed or forged. The generation may be older than the row's.
+    """
+    parts = token.split(".")
+    # isdigit() alone accepts digits like "²" that int() rejects
+    if len(parts) != 3 or not all(part.isascii() and part.isdigit() for part in parts[:2]):
+        return None
+    row = db.query(
+        models.RefreshToken.id,
+        models.RefreshToken.user_id,
+        models.RefreshToken.nonce,
+        models.RefreshToken.generation,
+        models.RefreshToken.expires_at,
+        models.User.user_name
+    ).join(models.User, models.User.id == models.RefreshToken.user_id).filter(
+        models.RefreshToken.id == int(parts[0])
+    ).first()
+    generation = int(parts[1])
+    if (row is None or generation > row.generation
+            or not hmac.compare_digest(parts[2], sign_refresh_token(row.id, generation, row.nonce))):
+        return None
+    return row, generation
+
+
+def _delete_refresh_login(db: Session, token_id: int) -> None:
+    db.query(models.RefreshToken).filter(models.RefreshToken.id == token_id).delete(synchronize_session=False)
+
+
+def purge_expired_refresh_tokens(db: Session) -> int:
+    """Delete logins whose refresh token has expired; returns how many. The caller commits."""
+    return db.query(models.RefreshToken).filter(
+        models.RefreshToken.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+
+def create_refresh_token(db: Session, user_id: int) -> str:
+    """Start a new login for a password login and return its first refresh token."""
+    global _last_refresh_purge
+    now = time.monotonic()
+    if now - _last_refresh_purge >= REFRESH_TOKEN_PURGE_INTERVAL:
+        _last_refresh_purge = now
+        purge_expired_refresh_tokens(db)
+    nonce = generate_refresh_nonce()
+    result = db.execute(insert(models.RefreshToken.__table__).values(
+        user_id=user_id,
+        nonce=nonce,
+        generation=0,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    db.commit()
+    return _refresh_token(result.inserted_primary_key[0], 0, nonce)
+
+
+def rotate_refresh_token(db: Session, token: str):
+    """
+    Exchange a refresh token for the next one of the same login.
+
+    The login's row is updated in place: its generation is bumped, which
+    invalidates the token presented, and its expiry is extended. Returns
+    (user name, new refresh token), or None if the token is unknown or
+    expired. Each token can be used once: presenting one of an older
+    generation means it leaked, so the whole login is deleted.
+    """
+    found = _find_refresh_token(db, token)
+    if found is None:
+        return None
+    row, generation = found
+    if row.expires_at <= datetime.utcnow():
+        return None
+    claimed = db.execute(
+        update(models.RefreshToken.__table__)
+        .where(models.RefreshToken.id == row.id, models.RefreshToken.generation == generation)
+        .values(generation=generation + 1,
+                expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    ).rowcount
+    if not claimed:
+        _delete_refresh_login(db, row.id)
+        db.commit()
+        return None
+    db.commit()
+    return row.user_name, _refresh_token(row.id, generation + 1, row.nonce)
+
+
+def revoke_refresh_token(db: Session, token: str, all_sessions: bool = False) -> bool:
+    """Delete a refresh token's login, or every login of its user. False if the token is unknown."""
+    found = _find_refresh_token(db, token)
+    if found is None:
+        return False
+    row, _ = found
+    if all_sessions:
+        db.query(models.RefreshToken).filter(models.RefreshToken.user_id == row.user_id).delete(
+            synchronize_session=False
+        )
+    else:
+        _delete_refresh_login(db, row.id)
+    db.commit()
+    return True
+
+
 def get_user_song_comments(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.SongComment).filter(models.SongComment.user_id == user_id).offset(skip).limit(limit).all()
+    return db.query(*_comment_columns(models.SongComment)).filter(models.SongComment.user_id == user_id).offset(skip).limit(limit).all()
 
 
 def get_user_artist_comments(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.ArtistComment).filter(models.ArtistComment.user_id == user_id).offset(skip).limit(
+    return db.query(*_comment_columns(models.ArtistComment)).filter(models.ArtistComment.user_id == user_id).offset(skip).limit(
         limit).all()
 
 
 def get_user_album_comments(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.AlbumComment).filter(models.AlbumComment.user_id == user_id).offset(skip).limit(limit).all()
+    return db.query(*_comment_columns(models.AlbumComment)).filter(models.AlbumComment.user_id == user_id).offset(skip).limit(limit).all()
+
+
+def get_user_activity(db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 20):
+    """
+    A user's song, artist and album comments as one stream, newest first.
+
+    Each comment table is read with a keyset query on (user_id, created, id)
+    limited to limit + 1 rows, and the three sorted results are merged with a
+    k-way merge. The cursor keeps one position per table, (created, id) of the
+    last comment taken from it or false once the table is exhausted, so each
+    table resumes exactly where it left off and exhausted ones aren't queried.
+    Raises ValueError for a malformed cursor.
+    """
+    sources = list(COMMENT_MODELS.items())
+    positions = [None] * len(sources)
+    if cursor is not None:
+        positions = decode_cursor(cursor)
+        if len(positions) != len(sources):
+            raise ValueError("Invalid cursor")
+
+    fetched = []
+    for (comment_type, model), position in zip(sources, positions):
+        if position is False:
+            fetched.append([])
+            continue
+        query = db.query(
+            literal(comment_type).label("type"),
+            model.id,
+            getattr(model, _COMMENT_ENTITY[model]).label("target_id"),
+            model.comment,
+            model.num_like,
+            model.star,
+            model.created,
+            model.modified
+        ).filter(model.user_id == user_id)
+        if position is not None:
+            try:
+                after = (datetime.fromisoformat(position[0]), int(position[1]))
+            except (IndexError, KeyError, TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            query = query.filter(
+                tuple_(model.created, model.id) < tuple_(*after, types=[model.created.type, model.id.type])
+            )
+        fetched.append(query.order_by(model.created.desc(), model.id.desc()).limit(limit + 1).all())
+
+    merged = heapq.merge(*fetched, key=lambda row: (row.created, row.id), reverse=True)
+    page = list(itertools.islice(merged, limit))
+
+    # Advance each source past the rows it contributed to this page. A source
+    # whose rows were all used returned at most `limit`, so it is exhausted.
+    taken = collections.Counter(row.type for row in page)
+    next_positions = []
+    for (comment_type, _), position, rows in zip(sources, positions, fetched):
+        count = taken[comment_type]
+        if count == len(rows):
+            next_positions.append(False)
+        elif count:
+            next_positions.append([rows[count - 1].created.isoformat(), rows[count - 1].id])
+        else:
+            next_positions.append(position)
+
+    next_cursor = None
+    if sum(map(len, fetched)) > len(page):
+        next_cursor = encode_cursor(next_positions)
+    return {"activity": page, "next_cursor": next_cursor}
 
 
 # Comment operations
-def create_song_comment(db: Session, comment: schemas.SongCommentCreate):
-    db_comment = models.SongComment(
-        song_id=comment.song_id,
-        comment=comment.comment,
-        num_like=comment.num_like,
-        user_id=comment.user_id,
-        star=comment.star
-    )
-    db.add(db_comment)
+COMMENT_MODELS = {
+    "song": models.SongComment,
+    "artist": models.ArtistComment,
+    "album": models.AlbumComment,
+}
+
+
+def like_comment(db: Session, comment_type: str, comment_id: int, user_id: int) -> Optional[bool]:
+    """
+    Record a user's like of a comment and atomically bump its num_like in the
+    same transaction; None when the comment doesn't exist, False when the user
+    already liked it. A like isn't an edit, so `modified` is left as it was.
+    """
+    model = COMMENT_MODELS[comment_type]
+    if db.query(model.id).filter(model.id == comment_id).first() is None:
+        return None
+    try:
+        db.execute(insert(models.CommentLike.__table__).values(
+            comment_type=comment_type, comment_id=comment_id, user_id=user_id
+        ))
+        db.execute(
+            update(model.__table__)
+            .where(model.__table__.c.id == comment_id)
+            .values(num_like=model.__table__.c.num_like + 1, modified=model.__table__.c.modified)
+        )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def has_liked_comment(db: Session, comment_type: str, comment_id: int, user_id: int) -> Optional[bool]:
+    """
+    Whether a user has a recorded like on a comment, in one read; None when
+    the comment doesn't exist. Used by the like buffer, which writes the like later.
+    """
+    model = COMMENT_MODELS[comment_type]
+    liked = db.query(models.CommentLike).filter(
+        models.CommentLike.comment_type == comment_type,
+        models.CommentLike.comment_id == model.id,
+        models.CommentLike.user_id == user_id
+    ).exists()
+    row = db.query(model.id, liked).filter(model.id == comment_id).first()
+    return None if row is None else bool(row[1])
+
+
+def delete_comment_likes(db: Session, comment_type: str, comment_id: int) -> None:
+    """Delete the like records of a comment that is being deleted; the caller commits."""
+    db.query(models.CommentLike).filter(
+        models.CommentLike.comment_type == comment_type,
+        models.CommentLike.comment_id == comment_id
+    ).delete(synchronize_session=False)
+
+
+def apply_comment_likes(db: Session, comment_type: str, likes: dict) -> None:
+    """
+    Write buffered likes ({comment id: set of user ids}) and commit.
+
+    Likes already recorded (e.g. through another worker) and likes of deleted
+    comments are skipped. The rest are inserted with one executemany, and each
+    comment's num_like is bumped by its number of new likes with one
+    executemany UPDATE.
+    """
+    model = COMMENT_MODELS[comment_type]
+    comments = _existing_keys(db, model.id, likes)
+    pairs = [(comment_id, user_id) for comment_id in comments for user_id in likes[comment_id]]
+    recorded = set()
+    key = tuple_(models.CommentLike.comment_id, models.CommentLike.user_id)
+    for start in range(0, len(pairs), BATCH_CHUNK_SIZE):
+        chunk = pairs[start:start + BATCH_CHUNK_SIZE]
+        recorded.update(tuple(pair) for pair in db.query(models.CommentLike.comment_id, models.CommentLike.user_id)
+                        .filter(models.CommentLike.comment_type == comment_type, key.in_(chunk)))
+    new = [pair for pair in pairs if pair not in recorded]
+    if new:
+        db.execute(insert(models.CommentLike.__table__), [
+            {"comment_type": comment_type, "comment_id": comment_id, "user_id": user_id}
+            for comment_id, user_id in new
+        ])
+        table = model.__table__
+        stmt = update(table).where(table.c.id == bindparam("comment_id")).values(
+            num_like=table.c.num_like + bindparam("delta"), modified=table.c.modified
+        )
+        deltas = collections.Counter(comment_id for comment_id, _ in new)
+        db.connection().execute(stmt, [
+            {"comment_id": comment_id, "delta": delta} for comment_id, delta in deltas.items()
+        ])
     db.commit()
-    db.refresh(db_comment)
-    return db_comment
 
 
-def get_song_comments(db: Session, song_id: str, skip: int = 0, limit: int = 100):
-    return db.query(models.SongComment).filter(models.SongComment.song_id == song_id).offset(skip).limit(limit).all()
+def create_song_comment(db: Session, comment: schemas.SongCommentCreate):
+    return _create_comment(db, models.SongComment, {
+        "song_id": comment.song_id,
+        "comment": comment.comment,
+        "num_like": comment.num_like,
+        "user_id": comment.user_id,
+        "star": comment.star
+    })
+
+
+def get_song_comments(db: Session, song_id: str, skip: int = 0, limit: int = 100,
+                     sort: Optional[str] = None, cursor: Optional[str] = None):
+    return _list_comments(db, models.SongComment, song_id, skip=skip, limit=limit, sort=sort, cursor=cursor)
 
 
 def create_artist_comment(db: Session, comment: schemas.ArtistCommentCreate):
-    db_comment = models.ArtistComment(
-        artist_id=comment.artist_id,
-        comment=comment.comment,
-        num_like=comment.num_like,
-        user_id=comment.user_id,
-        star=comment.star
-    )
-    db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
-    return db_comment
+    return _create_comment(db, models.ArtistComment, {
+        "artist_id": comment.artist_id,
+        "comment": comment.comment,
+        "num_like": comment.num_like,
+        "user_id": comment.user_id,
+        "star": comment.star
+    })
 
 
-def get_artist_comments(db: Session, artist_id: str, skip: int = 0, limit: int = 100):
-    return db.query(models.ArtistComment).filter(models.ArtistComment.artist_id == artist_id).offset(skip).limit(
-        limit).all()
+def get_artist_comments(db: Session, artist_id: str, skip: int = 0, limit: int = 100,
+                        sort: Optional[str] = None, cursor: Optional[str] = None):
+    return _list_comments(db, models.ArtistComment, artist_id, skip=skip, limit=limit, sort=sort, cursor=cursor,
+                          sorts=ARTIST_COMMENT_SORTS)
 
 
 def create_album_comment(db: Session, comment: schemas.AlbumCommentCreate):
-    db_comment = models.AlbumComment(
-        album_id=comment.album_id,
-        comment=comment.comment,
-        num_like=comment.num_like,
-        user_id=comment.user_id,
-        star=comment.star
-    )
-    db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
-    return db_comment
+    return _create_comment(db, models.AlbumComment, {
+        "album_id": comment.album_id,
+        "comment": comment.comment,
+        "num_like": comment.num_like,
+        "user_id": comment.user_id,
+        "star": comment.star
+    })
 
 
-def get_album_comments(db: Session, album_id: str, skip: int = 0, limit: int = 100):
-    return db.query(models.AlbumComment).filter(models.AlbumComment.album_id == album_id).offset(skip).limit(
-        limit).all()
+def get_album_comments(db: Session, album_id: str, skip: int = 0, limit: int = 100,
+                       sort: Optional[str] = None, cursor: Optional[str] = None):
+    return _list_comments(db, models.AlbumComment, album_id, skip=skip, limit=limit, sort=sort, cursor=cursor)
 
 
 # Search operations
@@ -342,23 +1078,15 @@ def get_song_rating(db: Session, song_id: str) -> schemas.SongRating:
     )
 
 
-def get_album_rating(db: Session, album_id: str):
-    """Calculate the average rating for an album."""
-    result = db.query(
-        func.avg(models.AlbumComment.star).label("average"),
-        func.count(models.AlbumComment.id).label("count")
-    ).filter(models.AlbumComment.album_id == album_id).first()
-    
+def _album_rating_summary(album_id: str, raw_avg, count: int):
+    """Build an album rating dict from the raw 1-100 average and comment count."""
     average = 0.0
-    count = 0
     stars = 0.0
     
-    if result and result.count > 0:
+    if count > 0:
         # Normalize average from 1-100 to 1-10 scale with one decimal place
-        raw_avg = result.average
         normalized = round((raw_avg / 10), 1)
         average = normalized
-        count = result.count
         
         # Calculate star representation (1-5 stars with half star precision)
         # 1 point = 0.5 stars, 10 points = 5 stars
@@ -375,30 +1103,50 @@ def get_album_rating(db: Session, album_id: str):
     }
 
 
+def get_album_rating(db: Session, album_id: str):
+    """Calculate the average rating for an album."""
+    result = db.query(
+        func.avg(models.AlbumComment.star).label("average"),
+        func.count(models.AlbumComment.id).label("count")
+    ).filter(models.AlbumComment.album_id == album_id).first()
+
+    if result and result.count > 0:
+        return _album_rating_summary(album_id, result.average, result.count)
+    return _album_rating_summary(album_id, None, 0)
+
+
+def get_album_ratings(db: Session, album_ids: List[str]):
+    """Calculate album ratings for several albums with one grouped query."""
+    if not album_ids:
+        return {}
+    rows = db.query(
+        models.AlbumComment.album_id,
+        func.avg(models.AlbumComment.star).label("average"),
+        func.count(models.AlbumComment.id).label("count")
+    ).filter(models.AlbumComment.album_id.in_(album_ids)).group_by(models.AlbumComment.album_id).all()
+
+    ratings = {album_id: _album_rating_summary(album_id, None, 0) for album_id in album_ids}
+    for row in rows:
+        ratings[row.album_id] = _album_rating_summary(row.album_id, row.average, row.count)
+    return ratings
+
+
 def get_album_songs_avg_rating(db: Session, album_id: str):
     """Calculate the average of song ratings for an album."""
-    # Get all songs for this album
-    songs = get_songs_by_album(db, album_id=album_id)
-    song_ids = [song.song_id for song in songs]
-    
-    if not song_ids:
-        return {
-            "album_id": album_id,
-            "average_rating": 0.0,
-            "total_ratings": 0,
-            "stars": 0.0
-        }
-    
-    # Aggregate song ratings
-    total_rating = 0
-    total_count = 0
-    
-    for song_id in song_ids:
-        song_rating = get_song_rating(db, song_id)
-        if song_rating["total_ratings"] > 0:
-            total_rating += song_rating["average_rating"]
-            total_count += 1
-    
+    # Per-song averages for this album's songs, aggregated in a single query
+    song_averages = db.query(
+        func.avg(models.SongComment.star).label('average')
+    ).join(
+        models.Song, models.Song.song_id == models.SongComment.song_id
+    ).filter(
+        models.Song.album_id == album_id,
+        models.SongComment.star.isnot(None)
+    ).group_by(models.SongComment.song_id).all()
+
+    # Aggregate song ratings, each song's average rounded like get_song_rating
+    total_rating = sum(round(row.average) for row in song_averages)
+    total_count = len(song_averages)
+
     average = 0.0
     stars = 0.0
     
@@ -418,3 +1166,58 @@ def get_album_songs_avg_rating(db: Session, album_id: str):
         "total_ratings": total_count,
         "stars": stars
     }
+
+
+# Composite page operations
+def _get_genre_summaries(db: Session, link_table, key_name: str, key):
+    """Genres linked to one album or artist, with the `summary` excerpt get_genres returns."""
+    return db.query(
+        models.Genre.id,
+        models.Genre.name,
+        func.substr(models.Genre.info, 1, schemas.GENRE_SUMMARY_LENGTH).label("summary")
+    ).join(
+        link_table, link_table.c.genre_id == models.Genre.id
+    ).filter(link_table.c[key_name] == key).order_by(models.Genre.id).all()
+
+
+def get_album_page(db: Session, album_id: str, comment_limit: int = 100):
+    """Load everything the album page renders with a fixed number of queries."""
+    album = db.query(models.Album).options(
+        joinedload(models.Album.artist),
+        joinedload(models.Album.meta).undefer(models.AlbumMeta.info),
+        selectinload(models.Album.songs)
+    ).filter(models.Album.album_id == album_id).first()
+    if album is None:
+        return None
+
+    return {
+        "album": album,
+        "artist": album.artist,
+        "meta": album.meta,
+        "genres": _get_genre_summaries(db, models.album_genre_link, "album_id", album_id),
+        "songs": sorted(album.songs, key=lambda song: song.order),
+        "rating": get_album_rating(db, album_id=album_id),
+        "songs_rating": get_album_songs_avg_rating(db, album_id=album_id),
+        "comments": get_album_comments(db, album_id=album_id, limit=comment_limit)["comments"]
+    }
+
+
+def get_artist_page(db: Session, artist_id: str, comment_limit: int = 100):
+    """Load everything the artist page renders with a fixed number of queries."""
+    artist = db.query(models.Artist).options(
+        joinedload(models.Artist.meta).undefer(models.ArtistMeta.info),
+        selectinload(models.Artist.albums)
+    ).filter(models.Artist.artist_id == artist_id).first()
+    if artist is None:
+        return None
+
+    albums = sorted(artist.albums, key=lambda album: album.release_date, reverse=True)
+    ratings = get_album_ratings(db, [album.album_id for album in albums])
+
+    return {
+        "artist": artist,
+        "meta": artist.meta,
+        "genres": _get_genre_summaries(db, models.artist_genre_link, "artist_id", artist_id),
+        "albums": [{"album": album, "rating": ratings[album.album_id]} for album in albums],
+        "comments": get_artist_comments(db, artist_id=artist_id, limit=comment_limit)["comments"]
+    }
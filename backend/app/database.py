@@ -21,8 +21,11 @@ print(f"DB_NAME: {os.getenv('DB_NAME')}")
 # Construct the database URL
 SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 print(SQLALCHEMY_DATABASE_URL)
+# Timestamps are stored as naive UTC: the server's now() defaults and the
+# values the app writes itself (crud._timestamps) must agree
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"init_command": "SET time_zone = '+00:00'"}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
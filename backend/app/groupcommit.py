@@ -0,0 +1,154 @@
+"""
+Group commit for comment writes.
+
+Enabled with COMMENT_GROUP_COMMIT=true. Comment handlers hand their row to a
+background worker instead of committing it themselves, then block on a
+future until the row is committed and its id assigned, so a 200 still means
+the comment is durable. The worker collects rows for up to
+COMMENT_BATCH_MAX_DELAY_MS milliseconds or COMMENT_BATCH_MAX_ROWS rows,
+whichever comes first, and writes them in one transaction, so one commit
+(and one fsync) is shared by the whole batch.
+
+Each handler waits in a threadpool thread, so the threadpool size also caps
+how many rows can be in flight in one batch. A row still queued after
+COMMENT_WRITE_TIMEOUT seconds is withdrawn, never written, and the request
+fails with 503 so it can be retried safely. Once the worker has taken a row
+into a batch, the handler waits for that batch however long it takes.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+COMMENT_GROUP_COMMIT = os.getenv("COMMENT_GROUP_COMMIT", "False").lower() == "true"
+COMMENT_BATCH_MAX_ROWS = int(os.getenv("COMMENT_BATCH_MAX_ROWS", "200"))
+COMMENT_BATCH_MAX_DELAY_MS = float(os.getenv("COMMENT_BATCH_MAX_DELAY_MS", "5"))
+COMMENT_WRITE_TIMEOUT = float(os.getenv("COMMENT_WRITE_TIMEOUT", "10"))
+
+_STOP = object()
+
+
+class GroupCommitTimeout(Exception):
+    """An item waited too long in the queue and was withdrawn without being written."""
+
+
+class GroupCommitQueue:
+    """
+    Single worker thread that writes submitted items in batches.
+
+    `write_batch(db, items)` must write all items in one transaction and
+    return one result per item: the value to hand back, or an exception to
+    raise in the submitting thread.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 write_batch: Callable[[Session, list], list],
+                 max_rows: int = COMMENT_BATCH_MAX_ROWS,
+                 max_delay: float = COMMENT_BATCH_MAX_DELAY_MS / 1000):
+        self.session_factory = session_factory
+        self.write_batch = write_batch
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="comment-group-commit", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write everything already submitted, then stop the worker."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def submit(self, item, timeout: float = COMMENT_WRITE_TIMEOUT):
+        """
+        Queue an item and block until its batch is committed; returns its result.
+
+        Raises GroupCommitTimeout if the worker hasn't taken the item within
+        `timeout` seconds; the item is then skipped and never written.
+        """
+        future: Future = Future()
+        self._queue.put((item, future))
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise GroupCommitTimeout("Comment write queue is backed up")
+        # The worker took it just in time; its batch will settle the future
+        return future.result()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._flush(batch)
+
+    def _flush(self, batch: List[tuple]) -> None:
+        # Drop items their submitter withdrew; the rest can no longer be cancelled
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        db = self.session_factory()
+        try:
+            results = self.write_batch(db, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+_queue: Optional[GroupCommitQueue] = None
+
+
+def start(session_factory: Callable[[], Session], write_batch: Callable[[Session, list], list]) -> None:
+    """Start the process-wide comment queue."""
+    global _queue
+    if _queue is None:
+        _queue = GroupCommitQueue(session_factory, write_batch)
+        _queue.start()
+
+
+def stop() -> None:
+    """Drain and stop the process-wide comment queue, if running."""
+    global _queue
+    if _queue is not None:
+        _queue.stop()
+        _queue = None
+
+
+def active_queue() -> Optional[GroupCommitQueue]:
+    return _queue
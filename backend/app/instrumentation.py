@@ -0,0 +1,131 @@
+"""
+Per-request timing and SQL statement instrumentation.
+
+`TimingMiddleware` times each sampled request and makes a `RequestStats`
+current for it. The engine listeners installed by `instrument_engine` add
+every statement run while that request is current: its count, the time
+spent in the driver, and the rows it returned. Rows are counted from the
+cursor's rowcount, which pymysql sets to the number of rows it buffered; a
+driver that reports -1 for SELECTs contributes no rows.
+
+A sampled request gets a `Server-Timing` header (`total`, `db`), and one JSON
+log line is written to the `app.instrumentation` logger at INFO when it
+finishes. REQUEST_TIMING_SAMPLE_RATE (0-1) is the fraction of requests that
+are sampled. A request that is not sampled costs one random() call in the
+middleware and a context variable lookup per statement.
+"""
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_TIMING_SAMPLE_RATE = float(os.getenv("REQUEST_TIMING_SAMPLE_RATE", "1.0"))
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    """What the SQL listeners collected for one request."""
+
+    __slots__ = ("sql_seconds", "statements", "rows")
+
+    def __init__(self):
+        self.sql_seconds = 0.0
+        self.statements = 0
+        self.rows = 0
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats of the sampled request being handled, or None."""
+    return _current_stats.get()
+
+
+def instrument_engine(engine) -> None:
+    """Count statements and time spent in SQL for the sampled request, if any."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_stats.get() is not None:
+            context._request_timing_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        started = getattr(context, "_request_timing_started", None)
+        if stats is None or started is None:
+            return
+        stats.sql_seconds += time.perf_counter() - started
+        stats.statements += 1
+        if cursor.description is not None and cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+
+_route_paths = {}
+
+
+def route_template(scope: Scope) -> str:
+    """Path template of the route that handled a request, e.g. `/songs/{song_id}`."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in _route_paths:
+        for route in getattr(scope.get("app"), "routes", ()):
+            if getattr(route, "endpoint", None) is not None:
+                _route_paths.setdefault(route.endpoint, route.path)
+    return _route_paths.get(endpoint, scope.get("path", "unmatched"))
+
+
+class TimingMiddleware:
+    """Add Server-Timing and a structured log line to a sample of requests."""
+
+    def __init__(self, app: ASGIApp, sample_rate: float = REQUEST_TIMING_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                headers = MutableHeaders(raw=message.setdefault("headers", []))
+                headers.append("Server-Timing", (
+                    f'total;dur={total_ms:.1f}, '
+                    f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.statements} statements"'
+                ))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "event": "request",
+                    "method": scope["method"],
+                    "route": route_template(scope),
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "sql_ms": round(stats.sql_seconds * 1000, 2),
+                    "sql_statements": stats.statements,
+                    "rows": stats.rows,
+                }))
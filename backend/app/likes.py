@@ -0,0 +1,152 @@
+"""
+Coalescing buffer for comment likes.
+
+Enabled with LIKE_BUFFER=true. Without it every like is an INSERT of its
+comment_likes row, an UPDATE of num_like and a commit. With it the request
+only reads (does the comment exist, did this user like it already) and adds
+the user to an in-memory map of (comment type, comment id) -> pending user
+ids. A background thread writes everything pending every
+LIKE_FLUSH_INTERVAL seconds in a single transaction: one executemany INSERT
+of the like rows and one executemany `num_like = num_like + n` UPDATE per
+comment type. A flush also starts early once LIKE_BUFFER_MAX_PENDING
+distinct comments have pending likes.
+
+Loss bound: likes are acknowledged before they are written, so a crash
+loses at most the likes received in the last LIKE_FLUSH_INTERVAL seconds
+(and never more than LIKE_BUFFER_MAX_PENDING comments' worth). A lost like
+loses both its row and its increment, so num_like stays equal to the number
+of like rows. A clean shutdown flushes everything. A failed flush puts its
+likes back to be retried on the next one, as long as that keeps the buffer
+within LIKE_BUFFER_MAX_PENDING comments; likes that don't fit are dropped,
+counted in `dropped` and logged.
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+LIKE_BUFFER = os.getenv("LIKE_BUFFER", "False").lower() == "true"
+LIKE_FLUSH_INTERVAL = float(os.getenv("LIKE_FLUSH_INTERVAL", "1.0"))
+LIKE_BUFFER_MAX_PENDING = int(os.getenv("LIKE_BUFFER_MAX_PENDING", "10000"))
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    """
+    Pending likes, flushed by a background thread.
+
+    `apply_likes(db, comment_type, likes)` must record the likes in `likes`
+    ({comment id: set of user ids}) on comments of `comment_type`, skipping
+    users who already liked the comment, and commit.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 apply_likes: Callable[[Session, str, Dict[int, Set[int]]], None],
+                 interval: float = LIKE_FLUSH_INTERVAL,
+                 max_pending: int = LIKE_BUFFER_MAX_PENDING):
+        self.session_factory = session_factory
+        self.apply_likes = apply_likes
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[str, int], Set[int]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        # Likes given up on after failed flushes, since the process started
+        self.dropped = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="like-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and write whatever is still pending."""
+        if self._thread is not None:
+            self._stopping = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def add(self, comment_type: str, comment_id: int, user_id: int) -> bool:
+        """Queue a user's like; False when the same like is already pending."""
+        with self._lock:
+            users = self._pending[(comment_type, comment_id)]
+            if user_id in users:
+                return False
+            users.add(user_id)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Write all pending likes now; returns the number of comments updated."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(set)
+            if not pending:
+                return 0
+
+            by_type: Dict[str, Dict[int, Set[int]]] = defaultdict(dict)
+            for (comment_type, comment_id), users in pending.items():
+                by_type[comment_type][comment_id] = users
+
+            db = self.session_factory()
+            try:
+                for comment_type, comment_likes in by_type.items():
+                    self.apply_likes(db, comment_type, comment_likes)
+            except Exception:
+                db.rollback()
+                logger.exception("Like flush failed for %d comments, retrying on the next flush", len(pending))
+                dropped = 0
+                with self._lock:
+                    for key, users in pending.items():
+                        if key in self._pending or len(self._pending) < self.max_pending:
+                            self._pending[key] |= users
+                        else:
+                            dropped += len(users)
+                    self.dropped += dropped
+                if dropped:
+                    logger.error("Like buffer full, dropped %d likes that failed to flush (%d since start)",
+                                 dropped, self.dropped)
+                return 0
+            finally:
+                db.close()
+            return len(pending)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+
+_buffer: Optional[LikeBuffer] = None
+
+
+def start(session_factory: Callable[[], Session],
+          apply_likes: Callable[[Session, str, Dict[int, Set[int]]], None]) -> None:
+    """Start the process-wide like buffer."""
+    global _buffer
+    if _buffer is None:
+        _buffer = LikeBuffer(session_factory, apply_likes)
+        _buffer.start()
+
+
+def stop() -> None:
+    """Flush and stop the process-wide like buffer, if running."""
+    global _buffer
+    if _buffer is not None:
+        _buffer.stop()
+        _buffer = None
+
+
+def active_buffer() -> Optional[LikeBuffer]:
+    return _buffer
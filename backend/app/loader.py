@@ -0,0 +1,87 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .utils import key_normalizer
+
+# Maximum number of keys per IN (...) query
+BATCH_CHUNK_SIZE = 500
+
+
+class RequestLoader:
+    """
+    Memo of rows by primary key, scoped to one database session, i.e. one request.
+
+    Nothing is deferred: `load` queries right away on a miss, and `load_many`
+    fetches all its missing keys with chunked IN queries. Keys queued with
+    `prime` are fetched along with the next query for the same model. Results,
+    including misses, are memoized for the rest of the session so repeated
+    existence checks don't go back to the database.
+
+    On MySQL a string key matches rows whose stored key differs in case,
+    accents or trailing spaces; `normalize` maps both sides to the collation
+    key so such rows are memoized under the key that was asked for.
+    """
+
+    def __init__(self, db: Session, normalize: Optional[Callable] = None):
+        self.db = db
+        self.normalize = normalize
+        self._cache: Dict[Any, Dict[Any, Any]] = defaultdict(dict)
+        self._pending: Dict[Any, Dict[Any, None]] = defaultdict(dict)
+
+    def prime(self, model, keys: Iterable) -> None:
+        """Queue keys so they are fetched with the next query for this model."""
+        cache = self._cache[model]
+        pending = self._pending[model]
+        for key in keys:
+            if key not in cache:
+                pending[key] = None
+
+    def load(self, model, key, *options):
+        """Return the row with this primary key, or None. `options` are applied to the query if one runs."""
+        cache = self._cache[model]
+        if key not in cache:
+            self._pending[model][key] = None
+            self._dispatch(model, options)
+        return cache[key]
+
+    def load_many(self, model, keys: Iterable, *options) -> List:
+        """Return rows for each key in order, None where missing."""
+        keys = list(keys)
+        self.prime(model, keys)
+        if self._pending[model]:
+            self._dispatch(model, options)
+        cache = self._cache[model]
+        return [cache[key] for key in keys]
+
+    def forget(self, model, key) -> None:
+        """Drop a memoized row (or miss) for a key written during this request."""
+        self._cache[model].pop(key, None)
+
+    def _dispatch(self, model, options=()) -> None:
+        keys = list(self._pending.pop(model, {}))
+        cache = self._cache[model]
+        key_column = model.__mapper__.primary_key[0]
+        key_attr = model.__mapper__.get_property_by_column(key_column).key
+        found = {}
+        for start in range(0, len(keys), BATCH_CHUNK_SIZE):
+            chunk = keys[start:start + BATCH_CHUNK_SIZE]
+            for row in self.db.query(model).options(*options).filter(key_column.in_(chunk)).all():
+                found[getattr(row, key_attr)] = row
+        normalized = {}
+        if self.normalize is not None:
+            normalized = {self.normalize(key): row for key, row in found.items()}
+        for key in keys:
+            row = found.get(key)
+            if row is None and normalized:
+                row = normalized.get(self.normalize(key))
+            cache[key] = row
+
+
+def get_loader(db: Session) -> RequestLoader:
+    """Return the loader bound to this session, creating it on first use."""
+    loader = db.info.get("loader")
+    if loader is None:
+        loader = db.info["loader"] = RequestLoader(db, key_normalizer(db))
+    return loader
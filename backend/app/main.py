@@ -1,8 +1,11 @@
 import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from enum import Enum
-from fastapi import FastAPI, Depends, HTTPException, Query, status, Security
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status, Security
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import timedelta
@@ -11,8 +14,22 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from . import crud
 from . import schemas
 from . import models
-from .database import get_db
-from .utils import convert_datetime_to_iso8601, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from . import catalog
+from . import groupcommit
+from . import likes
+from . import userimport
+from .database import get_db, SessionLocal, engine
+from .compression import CompressedBodyCache, CompressionMiddleware, accepts_encoding, uncompressed
+from .instrumentation import TimingMiddleware, instrument_engine
+from . import nplusone
+from . import metrics
+from . import slowlog
+from . import profiling
+from .textstore import decode_text, gzip_json_with_stored_field
+from .topcomments import top_comments
+from .passwords import hasher, PasswordHasherBusy, PASSWORD_HASH_RETRY_AFTER
+from .authcache import token_cache
+from .utils import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from jose import JWTError, jwt
 from .utils import SECRET_KEY, ALGORITHM
 
@@ -26,6 +43,12 @@ class ModelName(str, Enum):
     lenet = "lenet"
 
 
+class CommentType(str, Enum):
+    song = "song"
+    artist = "artist"
+    album = "album"
+
+
 app = FastAPI(title="Xiamiu API", description="Music database API for Xiamiu project")
 
 # Add CORS middleware
@@ -35,13 +58,124 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    # Keyset cursor of sorted comment listings, request timing, stored profile name
+    expose_headers=["X-Next-Cursor", "Server-Timing", "X-Profile-File"],
 )
 
+# Compress larger responses (lyrics, bios, list pages) with brotli or gzip
+compressed_bodies = CompressedBodyCache()
+app.add_middleware(CompressionMiddleware, cache=compressed_bodies)
+
+# Time a sample of requests and the SQL they run (Server-Timing header and a log line)
+instrument_engine(engine)
+app.add_middleware(TimingMiddleware)
+
+# Flag statements that repeat within one request (NPLUSONE_MODE=warn|raise|off)
+nplusone.instrument_engine(engine)
+app.add_middleware(nplusone.NPlusOneMiddleware)
+
+# Log statements slower than SLOW_QUERY_THRESHOLD_MS, optionally with EXPLAIN
+slowlog.instrument_engine(engine)
+app.add_middleware(slowlog.SlowQueryMiddleware)
+
+# Profile requests sent with X-Profile: <PROFILE_TOKEN>; not installed without a token
+if profiling.PROFILE_TOKEN:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Request counts and latency per route, plus pool, cache and hashing state, for GET /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.register_collector(metrics.pool_collector(engine))
+metrics.register_collector(metrics.cache_collector({
+    "auth_tokens": token_cache,
+    "top_comments": top_comments,
+    "compressed_bodies": compressed_bodies,
+}))
+metrics.register_collector(metrics.password_hash_collector(hasher))
+
+
+@app.on_event("startup")
+def load_catalog_snapshot():
+    """Load the in-memory catalog snapshot when CATALOG_SNAPSHOT is enabled."""
+    if catalog.CATALOG_SNAPSHOT:
+        db = SessionLocal()
+        try:
+            catalog.load(db)
+        finally:
+            db.close()
+
+
+@app.on_event("startup")
+def start_comment_group_commit():
+    """Start the comment group-commit worker when COMMENT_GROUP_COMMIT is enabled."""
+    if groupcommit.COMMENT_GROUP_COMMIT:
+        groupcommit.start(SessionLocal, crud.write_comment_batch)
+
+
+@app.on_event("shutdown")
+def stop_comment_group_commit():
+    """Commit comments still queued before the process exits."""
+    groupcommit.stop()
+
+
+@app.on_event("startup")
+def start_like_buffer():
+    """Start the like buffer when LIKE_BUFFER is enabled."""
+    if likes.LIKE_BUFFER:
+        likes.start(SessionLocal, crud.apply_comment_likes)
+
+
+@app.on_event("shutdown")
+def stop_like_buffer():
+    """Write buffered likes before the process exits."""
+    likes.stop()
+
+
+@app.on_event("shutdown")
+def stop_user_import_pool():
+    userimport.shutdown()
+
+
+@app.on_event("startup")
+def start_metrics_writer():
+    """Share this worker's metrics through METRICS_DIR when it is set."""
+    metrics.start()
+
+
+@app.on_event("shutdown")
+def stop_metrics_writer():
+    metrics.stop()
+
+
+@app.exception_handler(groupcommit.GroupCommitTimeout)
+async def comment_write_timeout(request: Request, exc: groupcommit.GroupCommitTimeout):
+    """The comment was withdrawn from the group-commit queue unwritten, so retrying is safe."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many comment writes in progress, try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    """Shed password hashing load instead of queueing it without bound."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many password operations in progress, try again shortly"},
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+    )
+
+
 # Set up OAuth2 with Password Flow
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Tokens verified recently skip the JWT check and the database lookup
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached[1]
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -55,12 +189,89 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_name(db, user_name=token_data.username)
+    user = await run_in_threadpool(crud.get_user_by_name, db, token_data.username)
     if user is None:
         raise credentials_exception
+    user = schemas.User.model_validate(user)
+    token_cache.put(token, payload, user)
     return user
 
 
+# Comma-separated user names allowed to use the admin endpoints
+ADMIN_USERS = {name.strip() for name in os.getenv("ADMIN_USERS", "").split(",") if name.strip()}
+
+
+async def get_admin_user(current_user: schemas.User = Depends(get_current_user)):
+    if current_user.user_name not in ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
+def parse_id_list(ids: str) -> List[str]:
+    """Split a comma-separated ids query parameter, enforcing the batch size limit."""
+    id_list = [i.strip() for i in ids.split(",") if i.strip()]
+    if len(id_list) > schemas.MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {schemas.MAX_BATCH_IDS} ids per request")
+    return id_list
+
+
+def stored_text_response(request: Request, fields: dict, name: str, stored: bytes):
+    """
+    Respond with `fields` plus the stored text field `name`.
+
+    When the client accepts gzip and the text is stored deflate-compressed, the
+    stored stream is spliced into a gzip response without decompressing it.
+    """
+    if accepts_encoding(request.headers.get("accept-encoding", ""), "gzip"):
+        body = gzip_json_with_stored_field(fields, name, stored)
+        if body is not None:
+            return Response(content=body, media_type="application/json",
+                            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return {**fields, name: decode_text(stored)}
+
+
+@contextmanager
+def constraint_errors(duplicate: Optional[str] = None, **missing: str):
+    """
+    Map constraint violations raised by a crud create to HTTP errors.
+
+    A duplicate key becomes a 400 with `duplicate`; a missing foreign key row
+    becomes a 404 with the detail given for that column, or a generic detail
+    when the driver doesn't say which column failed (SQLite).
+    """
+    try:
+        yield
+    except crud.DuplicateError:
+        raise HTTPException(status_code=400, detail=duplicate)
+    except crud.MissingReferenceError as e:
+        detail = missing.get(e.column, "Referenced row not found")
+        raise HTTPException(status_code=404, detail=detail)
+
+
+def comment_listing(response: Response, list_comments, **kwargs):
+    """
+    Run a crud comment listing and return its rows.
+
+    The cursor of the next page goes in the X-Next-Cursor header so the
+    response body stays a plain list.
+    """
+    try:
+        page = list_comments(**kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page["next_cursor"] is not None:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["comments"]
+
+
+COMMENT_SORT_DESCRIPTION = "-num_like (most liked), -created (newest), star or -star"
+
+
+def check_bulk_size(items: list):
+    if len(items) > schemas.MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {schemas.MAX_BULK_ITEMS} items per request")
+
+
 # Root endpoint
 @app.get("/")
 def read_root():
@@ -70,8 +281,10 @@ def read_root():
 # Authentication endpoints
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    # The lookup runs in the threadpool and bcrypt in the bounded password
+    # executor, so neither blocks the event loop
+    user = await run_in_threadpool(crud.get_user_by_name, db, form_data.username)
+    if not user or not await hasher.verify_async(form_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -81,7 +294,62 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     access_token = create_access_token(
         data={"sub": user.user_name}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = await run_in_threadpool(crud.create_refresh_token, db, user.id)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@app.post("/token/refresh", response_model=schemas.Token)
+def refresh_access_token(request: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Trade a refresh token for a new access token and a new refresh token, without a password check."""
+    rotated = crud.rotate_refresh_token(db, request.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_name, refresh_token = rotated
+    access_token = create_access_token(
+        data={"sub": user_name}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@app.post("/token/revoke")
+def revoke_refresh_token(request: schemas.RevokeTokenRequest, db: Session = Depends(get_db)):
+    """Log out: revoke this login's refresh tokens, or all of the user's with `all_sessions`."""
+    if not crud.revoke_refresh_token(db, request.refresh_token, all_sessions=request.all_sessions):
+        raise HTTPException(status_code=404, detail="Refresh token not found")
+    return {"message": "Refresh token revoked"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus metrics of all workers (see app/metrics.py)."""
+    return PlainTextResponse(metrics.render(metrics.collect()), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/slow-queries", response_model=schemas.SlowQueryReport)
+def read_slow_queries(
+    limit: int = Query(20, ge=1, le=100),
+    admin: schemas.User = Depends(get_admin_user)
+):
+    """Slow statement fingerprints of this worker, worst total time first."""
+    return {
+        "threshold_ms": slowlog.SLOW_QUERY_THRESHOLD_MS,
+        "suppressed_log_lines": slowlog.slow_queries.suppressed,
+        "statements": slowlog.slow_queries.top(limit),
+    }
+
+
+@app.get("/admin/profiles/{name}")
+@uncompressed
+def read_profile(name: str, admin: schemas.User = Depends(get_admin_user)):
+    """Download a profile stored by a request sent with the X-Profile header."""
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name)
 
 
 @app.get("/users/me", response_model=schemas.User)
@@ -107,6 +375,19 @@ def read_user_album_comments(user_id: int, skip: int = 0, limit: int = 100, db:
     return comments
 
 
+@app.get("/users/{user_id}/activity", response_model=schemas.ActivityPage)
+def read_user_activity(user_id: int, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100),
+                       db: Session = Depends(get_db)):
+    """A user's song, artist and album comments as one stream, newest first."""
+    db_user = crud.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        return crud.get_user_activity(db, user_id=user_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # Search endpoint (similar to Django's SearchView)
 @app.get("/search/", response_model=schemas.SearchResponse)
 def search(query: str = Query(..., description="Search query"), db: Session = Depends(get_db)):
@@ -117,21 +398,22 @@ def search(query: str = Query(..., description="Search query"), db: Session = De
 # Genre endpoints
 @app.post("/genres/", response_model=schemas.Genre)
 def create_genre(genre: schemas.GenreCreate, db: Session = Depends(get_db)):
+    # genres.name has no unique constraint, so this one keeps its pre-check
     db_genre = crud.get_genre_by_name(db, name=genre.name)
     if db_genre:
         raise HTTPException(status_code=400, detail="Genre already registered")
     return crud.create_genre(db=db, genre=genre)
 
 
-@app.get("/genres/", response_model=List[schemas.Genre])
+@app.get("/genres/", response_model=List[schemas.GenreSummary])
 def read_genres(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    genres = crud.get_genres(db, skip=skip, limit=limit)
+    genres = catalog.reader(db).get_genres(skip=skip, limit=limit)
     return genres
 
 
 @app.get("/genres/{genre_id}", response_model=schemas.Genre)
 def read_genre(genre_id: int, db: Session = Depends(get_db)):
-    db_genre = crud.get_genre(db, genre_id=genre_id)
+    db_genre = catalog.reader(db).get_genre(genre_id=genre_id)
     if db_genre is None:
         raise HTTPException(status_code=404, detail="Genre not found")
     return db_genre
@@ -139,46 +421,64 @@ def read_genre(genre_id: int, db: Session = Depends(get_db)):
 
 @app.get("/genres/{genre_id}/artists", response_model=List[schemas.Artist])
 def read_artists_by_genre(genre_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_genre = crud.get_genre(db, genre_id=genre_id)
+    catalog_reader = catalog.reader(db)
+    db_genre = catalog_reader.get_genre(genre_id=genre_id)
     if db_genre is None:
         raise HTTPException(status_code=404, detail="Genre not found")
-    artists = crud.get_artists_by_genre(db, genre_id=genre_id, skip=skip, limit=limit)
+    artists = catalog_reader.get_artists_by_genre(genre_id=genre_id, skip=skip, limit=limit)
     return artists
 
 
 @app.get("/genres/{genre_id}/albums", response_model=List[schemas.Album])
 def read_albums_by_genre(genre_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_genre = crud.get_genre(db, genre_id=genre_id)
+    catalog_reader = catalog.reader(db)
+    db_genre = catalog_reader.get_genre(genre_id=genre_id)
     if db_genre is None:
         raise HTTPException(status_code=404, detail="Genre not found")
-    albums = crud.get_albums_by_genre(db, genre_id=genre_id, skip=skip, limit=limit)
+    albums = catalog_reader.get_albums_by_genre(genre_id=genre_id, skip=skip, limit=limit)
     return albums
 
 
 # Artist endpoints
 @app.post("/artists/", response_model=schemas.Artist)
 def create_artist(artist: schemas.ArtistCreate, db: Session = Depends(get_db)):
-    db_artist = crud.get_artist(db, artist_id=artist.artist_id)
-    if db_artist:
-        raise HTTPException(status_code=400, detail="Artist ID already registered")
-    return crud.create_artist(db=db, artist=artist)
+    with constraint_errors("Artist ID already registered"):
+        return crud.create_artist(db=db, artist=artist)
+
+
+@app.post("/artists/genre-links/bulk", response_model=schemas.BulkCreateResult)
+def create_artist_genre_links_bulk(links: List[schemas.ArtistGenreLinkCreate], db: Session = Depends(get_db)):
+    check_bulk_size(links)
+    return crud.bulk_create_artist_genre_links(db=db, links=links)
 
 
 @app.get("/artists/", response_model=List[schemas.Artist])
 def read_artists(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    artists = crud.get_artists(db, skip=skip, limit=limit)
+    artists = catalog.reader(db).get_artists(skip=skip, limit=limit)
     return artists
 
 
 @app.get("/artists/region/{region}", response_model=List[schemas.Artist])
 def read_artists_by_region(region: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    artists = crud.get_artists_by_region(db, region=region, skip=skip, limit=limit)
+    artists = catalog.reader(db).get_artists_by_region(region=region, skip=skip, limit=limit)
     return artists
 
 
+@app.get("/artists/batch", response_model=schemas.ArtistBatch)
+def read_artists_batch(ids: str = Query(..., description="Comma-separated artist ids"), db: Session = Depends(get_db)):
+    """Get several artists by id in input order; unknown ids are listed under `missing`."""
+    return crud.get_artists_by_ids(db, artist_ids=parse_id_list(ids))
+
+
+@app.post("/artists/batch", response_model=schemas.ArtistBatch)
+def read_artists_batch_post(batch: schemas.BatchIds, db: Session = Depends(get_db)):
+    """Same as GET /artists/batch, for id lists too long for a URL."""
+    return crud.get_artists_by_ids(db, artist_ids=batch.ids)
+
+
 @app.get("/artists/{artist_id}", response_model=schemas.Artist)
 def read_artist(artist_id: str, db: Session = Depends(get_db)):
-    db_artist = crud.get_artist(db, artist_id=artist_id)
+    db_artist = catalog.reader(db).get_artist(artist_id=artist_id)
     if db_artist is None:
         raise HTTPException(status_code=404, detail="Artist not found")
     return db_artist
@@ -186,37 +486,83 @@ def read_artist(artist_id: str, db: Session = Depends(get_db)):
 
 @app.get("/artists/{artist_id}/albums", response_model=List[schemas.Album])
 def read_artist_albums(artist_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_artist = crud.get_artist(db, artist_id=artist_id)
+    catalog_reader = catalog.reader(db)
+    db_artist = catalog_reader.get_artist(artist_id=artist_id)
     if db_artist is None:
         raise HTTPException(status_code=404, detail="Artist not found")
-    albums = crud.get_albums_by_artist(db, artist_id=artist_id, skip=skip, limit=limit)
+    albums = catalog_reader.get_albums_by_artist(artist_id=artist_id, skip=skip, limit=limit)
     return albums
 
 
+@app.get("/artists/{artist_id}/songs", response_model=schemas.ArtistSongPage)
+def read_artist_songs(artist_id: str, cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=500),
+                      sort: Optional[str] = Query(None, description="release_date or -release_date"),
+                      db: Session = Depends(get_db)):
+    db_artist = crud.get_artist(db, artist_id=artist_id)
+    if db_artist is None:
+        raise HTTPException(status_code=404, detail="Artist not found")
+    try:
+        return crud.get_songs_by_artist(db, artist_id=artist_id, cursor=cursor, limit=limit, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/artists/{artist_id}/page", response_model=schemas.ArtistPage)
+def read_artist_page(artist_id: str, comment_limit: int = Query(100, ge=0, le=500), db: Session = Depends(get_db)):
+    """Get an artist with meta, genres, rated discography and comments in one response."""
+    page = crud.get_artist_page(db, artist_id=artist_id, comment_limit=comment_limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Artist not found")
+    return page
+
+
 # Album endpoints
 @app.post("/albums/", response_model=schemas.Album)
 def create_album(album: schemas.AlbumCreate, db: Session = Depends(get_db)):
-    db_album = crud.get_album(db, album_id=album.album_id)
-    if db_album:
-        raise HTTPException(status_code=400, detail="Album ID already registered")
-    return crud.create_album(db=db, album=album)
+    with constraint_errors("Album ID already registered", artist_id="Artist not found"):
+        return crud.create_album(db=db, album=album)
+
+
+@app.post("/albums/bulk", response_model=schemas.BulkCreateResult)
+def create_albums_bulk(albums: List[schemas.AlbumCreate], db: Session = Depends(get_db)):
+    """Create many albums in one transaction; each item reports created, duplicate or missing_reference."""
+    check_bulk_size(albums)
+    return crud.bulk_create_albums(db=db, albums=albums)
+
+
+@app.post("/albums/genre-links/bulk", response_model=schemas.BulkCreateResult)
+def create_album_genre_links_bulk(links: List[schemas.AlbumGenreLinkCreate], db: Session = Depends(get_db)):
+    check_bulk_size(links)
+    return crud.bulk_create_album_genre_links(db=db, links=links)
 
 
 @app.get("/albums/", response_model=List[schemas.Album])
 def read_albums(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    albums = crud.get_albums(db, skip=skip, limit=limit)
+    albums = catalog.reader(db).get_albums(skip=skip, limit=limit)
     return albums
 
 
 @app.get("/albums/language/{language}", response_model=List[schemas.Album])
 def read_albums_by_language(language: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    albums = crud.get_albums_by_language(db, album_lan=language, skip=skip, limit=limit)
+    albums = catalog.reader(db).get_albums_by_language(album_lan=language, skip=skip, limit=limit)
     return albums
 
 
+@app.get("/albums/batch", response_model=schemas.AlbumBatch)
+def read_albums_batch(ids: str = Query(..., description="Comma-separated album ids"), db: Session = Depends(get_db)):
+    """Get several albums by id in input order; unknown ids are listed under `missing`."""
+    return crud.get_albums_by_ids(db, album_ids=parse_id_list(ids))
+
+
+@app.post("/albums/batch", response_model=schemas.AlbumBatch)
+def read_albums_batch_post(batch: schemas.BatchIds, db: Session = Depends(get_db)):
+    """Same as GET /albums/batch, for id lists too long for a URL."""
+    return crud.get_albums_by_ids(db, album_ids=batch.ids)
+
+
 @app.get("/albums/{album_id}", response_model=schemas.Album)
 def read_album(album_id: str, db: Session = Depends(get_db)):
-    db_album = crud.get_album(db, album_id=album_id)
+    db_album = catalog.reader(db).get_album(album_id=album_id)
     if db_album is None:
         raise HTTPException(status_code=404, detail="Album not found")
     return db_album
@@ -224,31 +570,70 @@ def read_album(album_id: str, db: Session = Depends(get_db)):
 
 @app.get("/albums/{album_id}/songs", response_model=List[schemas.Song])
 def read_album_songs(album_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_album = crud.get_album(db, album_id=album_id)
+    catalog_reader = catalog.reader(db)
+    db_album = catalog_reader.get_album(album_id=album_id)
     if db_album is None:
         raise HTTPException(status_code=404, detail="Album not found")
-    songs = crud.get_songs_by_album(db, album_id=album_id, skip=skip, limit=limit)
+    songs = catalog_reader.get_songs_by_album(album_id=album_id, skip=skip, limit=limit)
     return songs
 
 
+@app.get("/albums/{album_id}/page", response_model=schemas.AlbumPage)
+def read_album_page(album_id: str, comment_limit: int = Query(100, ge=0, le=500), db: Session = Depends(get_db)):
+    """Get an album with its artist, meta, genres, songs, ratings and comments in one response."""
+    page = crud.get_album_page(db, album_id=album_id, comment_limit=comment_limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Album not found")
+    return page
+
+
 # Song endpoints
 @app.post("/songs/", response_model=schemas.Song)
 def create_song(song: schemas.SongCreate, db: Session = Depends(get_db)):
-    db_song = crud.get_song(db, song_id=song.song_id)
-    if db_song:
-        raise HTTPException(status_code=400, detail="Song ID already registered")
-    return crud.create_song(db=db, song=song)
+    with constraint_errors("Song ID already registered", album_id="Album not found"):
+        return crud.create_song(db=db, song=song)
+
+
+@app.post("/songs/bulk", response_model=schemas.BulkCreateResult)
+def create_songs_bulk(songs: List[schemas.SongCreate], db: Session = Depends(get_db)):
+    """Create many songs in one transaction; each item reports created, duplicate or missing_reference."""
+    check_bulk_size(songs)
+    return crud.bulk_create_songs(db=db, songs=songs)
+
+
+@app.post("/songs/meta/bulk", response_model=schemas.BulkCreateResult)
+def create_song_meta_bulk(metas: List[schemas.SongMetaCreate], db: Session = Depends(get_db)):
+    check_bulk_size(metas)
+    return crud.bulk_create_song_meta(db=db, metas=metas)
+
+
+@app.post("/songs/artist-links/bulk", response_model=schemas.BulkCreateResult)
+def create_song_artist_links_bulk(links: List[schemas.SongArtistLinkCreate], db: Session = Depends(get_db)):
+    check_bulk_size(links)
+    return crud.bulk_create_song_artist_links(db=db, links=links)
 
 
 @app.get("/songs/", response_model=List[schemas.Song])
 def read_songs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    songs = crud.get_songs(db, skip=skip, limit=limit)
+    songs = catalog.reader(db).get_songs(skip=skip, limit=limit)
     return songs
 
 
+@app.get("/songs/batch", response_model=schemas.SongBatch)
+def read_songs_batch(ids: str = Query(..., description="Comma-separated song ids"), db: Session = Depends(get_db)):
+    """Get several songs by id in input order; unknown ids are listed under `missing`."""
+    return crud.get_songs_by_ids(db, song_ids=parse_id_list(ids))
+
+
+@app.post("/songs/batch", response_model=schemas.SongBatch)
+def read_songs_batch_post(batch: schemas.BatchIds, db: Session = Depends(get_db)):
+    """Same as GET /songs/batch, for id lists too long for a URL."""
+    return crud.get_songs_by_ids(db, song_ids=batch.ids)
+
+
 @app.get("/songs/{song_id}", response_model=schemas.Song)
 def read_song(song_id: str, db: Session = Depends(get_db)):
-    db_song = crud.get_song(db, song_id=song_id)
+    db_song = catalog.reader(db).get_song(song_id=song_id)
     if db_song is None:
         raise HTTPException(status_code=404, detail="Song not found")
     return db_song
@@ -257,71 +642,71 @@ def read_song(song_id: str, db: Session = Depends(get_db)):
 # Meta endpoints
 @app.post("/songs/{song_id}/meta", response_model=schemas.SongMeta)
 def create_song_meta_info(song_id: str, meta: schemas.SongMetaCreate, db: Session = Depends(get_db)):
-    db_song = crud.get_song(db, song_id=song_id)
-    if db_song is None:
-        raise HTTPException(status_code=404, detail="Song not found")
-    db_meta = crud.get_song_meta(db, song_id=song_id)
-    if db_meta:
-        raise HTTPException(status_code=400, detail="Song meta already exists")
     meta.song_id = song_id
-    return crud.create_song_meta(db=db, meta=meta)
+    with constraint_errors("Song meta already exists", song_id="Song not found"):
+        return crud.create_song_meta(db=db, meta=meta)
 
 
 @app.get("/songs/{song_id}/meta", response_model=schemas.SongMeta)
-def read_song_meta(song_id: str, db: Session = Depends(get_db)):
-    db_meta = crud.get_song_meta(db, song_id=song_id)
+def read_song_meta(song_id: str, request: Request, db: Session = Depends(get_db)):
+    db_meta = crud.get_song_meta_stored(db, song_id=song_id)
     if db_meta is None:
         raise HTTPException(status_code=404, detail="Song meta not found")
-    return db_meta
+    return stored_text_response(request, {"song_id": db_meta.song_id}, "lyrics", db_meta.lyrics)
 
 
 @app.post("/artists/{artist_id}/meta", response_model=schemas.ArtistMeta)
 def create_artist_meta_info(artist_id: str, meta: schemas.ArtistMetaCreate, db: Session = Depends(get_db)):
-    db_artist = crud.get_artist(db, artist_id=artist_id)
-    if db_artist is None:
-        raise HTTPException(status_code=404, detail="Artist not found")
-    db_meta = crud.get_artist_meta(db, artist_id=artist_id)
-    if db_meta:
-        raise HTTPException(status_code=400, detail="Artist meta already exists")
     meta.artist_id = artist_id
-    return crud.create_artist_meta(db=db, meta=meta)
+    with constraint_errors("Artist meta already exists", artist_id="Artist not found"):
+        return crud.create_artist_meta(db=db, meta=meta)
 
 
 @app.get("/artists/{artist_id}/meta", response_model=schemas.ArtistMeta)
-def read_artist_meta(artist_id: str, db: Session = Depends(get_db)):
-    db_meta = crud.get_artist_meta(db, artist_id=artist_id)
+def read_artist_meta(artist_id: str, request: Request, db: Session = Depends(get_db)):
+    db_meta = crud.get_artist_meta_stored(db, artist_id=artist_id)
     if db_meta is None:
         raise HTTPException(status_code=404, detail="Artist meta not found")
-    return db_meta
+    fields = {"artist_id": db_meta.artist_id, "pic_address": db_meta.pic_address}
+    return stored_text_response(request, fields, "info", db_meta.info)
 
 
 @app.post("/albums/{album_id}/meta", response_model=schemas.AlbumMeta)
 def create_album_meta_info(album_id: str, meta: schemas.AlbumMetaCreate, db: Session = Depends(get_db)):
-    db_album = crud.get_album(db, album_id=album_id)
-    if db_album is None:
-        raise HTTPException(status_code=404, detail="Album not found")
-    db_meta = crud.get_album_meta(db, album_id=album_id)
-    if db_meta:
-        raise HTTPException(status_code=400, detail="Album meta already exists")
     meta.album_id = album_id
-    return crud.create_album_meta(db=db, meta=meta)
+    with constraint_errors("Album meta already exists", album_id="Album not found"):
+        return crud.create_album_meta(db=db, meta=meta)
 
 
 @app.get("/albums/{album_id}/meta", response_model=schemas.AlbumMeta)
-def read_album_meta(album_id: str, db: Session = Depends(get_db)):
-    db_meta = crud.get_album_meta(db, album_id=album_id)
+def read_album_meta(album_id: str, request: Request, db: Session = Depends(get_db)):
+    db_meta = crud.get_album_meta_stored(db, album_id=album_id)
     if db_meta is None:
         raise HTTPException(status_code=404, detail="Album meta not found")
-    return db_meta
+    fields = {"album_id": db_meta.album_id, "pic_address": db_meta.pic_address}
+    return stored_text_response(request, fields, "info", db_meta.info)
 
 
 # User endpoints
 @app.post("/users/", response_model=schemas.User)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_name(db, user_name=user.user_name)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+    with constraint_errors("Username already registered"):
+        return crud.create_user(db=db, user=user)
+
+
+@app.post("/users/import", response_model=schemas.UserImportResult)
+async def import_users(
+    request: schemas.UserImport,
+    db: Session = Depends(get_db),
+    admin: schemas.User = Depends(get_admin_user)
+):
+    """
+    Create many users at once; plaintext passwords are hashed across a process pool.
+
+    The import runs on a thread of its own, one import at a time, instead of
+    holding a threadpool thread for its whole duration.
+    """
+    return await userimport.run_import(db, request.users)
 
 
 @app.get("/users/", response_model=List[schemas.User])
@@ -341,62 +726,38 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
 # Comment endpoints
 @app.post("/songs/{song_id}/comments", response_model=schemas.SongComment)
 def create_comment_for_song(song_id: str, comment: schemas.SongCommentCreate, db: Session = Depends(get_db)):
-    db_song = crud.get_song(db, song_id=song_id)
-    if db_song is None:
-        raise HTTPException(status_code=404, detail="Song not found")
     comment.song_id = song_id
-    created_comment = crud.create_song_comment(db=db, comment=comment)
-    
-    # Convert datetime fields to strings
-    created_comment.created = convert_datetime_to_iso8601(created_comment.created)
-    created_comment.modified = convert_datetime_to_iso8601(created_comment.modified)
-    
-    return created_comment
+    with constraint_errors(song_id="Song not found", user_id="User not found"):
+        return crud.create_song_comment(db=db, comment=comment)
 
 
 @app.get("/songs/{song_id}/comments", response_model=List[schemas.SongComment])
-def read_comments_for_song(song_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_comments_for_song(song_id: str, response: Response, skip: int = 0, limit: int = 100,
+                           sort: Optional[str] = Query(None, description=COMMENT_SORT_DESCRIPTION),
+                           cursor: Optional[str] = None, db: Session = Depends(get_db)):
     db_song = crud.get_song(db, song_id=song_id)
     if db_song is None:
         raise HTTPException(status_code=404, detail="Song not found")
-    comments = crud.get_song_comments(db, song_id=song_id, skip=skip, limit=limit)
-    
-    # Convert datetime fields to strings
-    for comment in comments:
-        comment.created = convert_datetime_to_iso8601(comment.created)
-        comment.modified = convert_datetime_to_iso8601(comment.modified)
-    
-    return comments
+    return comment_listing(response, crud.get_song_comments, db=db, song_id=song_id, skip=skip, limit=limit,
+                           sort=sort, cursor=cursor)
 
 
 @app.post("/artists/{artist_id}/comments", response_model=schemas.ArtistComment)
 def create_comment_for_artist(artist_id: str, comment: schemas.ArtistCommentCreate, db: Session = Depends(get_db)):
-    db_artist = crud.get_artist(db, artist_id=artist_id)
-    if db_artist is None:
-        raise HTTPException(status_code=404, detail="Artist not found")
     comment.artist_id = artist_id
-    created_comment = crud.create_artist_comment(db=db, comment=comment)
-    
-    # Convert datetime fields to strings
-    created_comment.created = convert_datetime_to_iso8601(created_comment.created)
-    created_comment.modified = convert_datetime_to_iso8601(created_comment.modified)
-    
-    return created_comment
+    with constraint_errors(artist_id="Artist not found", user_id="User not found"):
+        return crud.create_artist_comment(db=db, comment=comment)
 
 
 @app.get("/artists/{artist_id}/comments", response_model=List[schemas.ArtistComment])
-def read_comments_for_artist(artist_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_comments_for_artist(artist_id: str, response: Response, skip: int = 0, limit: int = 100,
+                             sort: Optional[str] = Query(None, description=crud.ARTIST_COMMENT_SORT_DESCRIPTION),
+                             cursor: Optional[str] = None, db: Session = Depends(get_db)):
     db_artist = crud.get_artist(db, artist_id=artist_id)
     if db_artist is None:
         raise HTTPException(status_code=404, detail="Artist not found")
-    comments = crud.get_artist_comments(db, artist_id=artist_id, skip=skip, limit=limit)
-    
-    # Convert datetime fields to strings
-    for comment in comments:
-        comment.created = convert_datetime_to_iso8601(comment.created)
-        comment.modified = convert_datetime_to_iso8601(comment.modified)
-    
-    return comments
+    return comment_listing(response, crud.get_artist_comments, db=db, artist_id=artist_id, skip=skip, limit=limit,
+                           sort=sort, cursor=cursor)
 
 
 @app.delete("/artists/comments/{comment_id}")
@@ -406,39 +767,30 @@ def delete_artist_comment(comment_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Comment not found")
     
     # Delete the comment
+    artist_id = db_comment.artist_id
     db.delete(db_comment)
+    crud.delete_comment_likes(db, "artist", comment_id)
     db.commit()
+    top_comments.invalidate(models.ArtistComment, artist_id)
     return {"message": "Comment deleted successfully"}
 
 
 @app.post("/albums/{album_id}/comments", response_model=schemas.AlbumComment)
 def create_comment_for_album(album_id: str, comment: schemas.AlbumCommentCreate, db: Session = Depends(get_db)):
-    db_album = crud.get_album(db, album_id=album_id)
-    if db_album is None:
-        raise HTTPException(status_code=404, detail="Album not found")
     comment.album_id = album_id
-    created_comment = crud.create_album_comment(db=db, comment=comment)
-    
-    # Convert datetime fields to strings
-    created_comment.created = convert_datetime_to_iso8601(created_comment.created)
-    created_comment.modified = convert_datetime_to_iso8601(created_comment.modified)
-    
-    return created_comment
+    with constraint_errors(album_id="Album not found", user_id="User not found"):
+        return crud.create_album_comment(db=db, comment=comment)
 
 
 @app.get("/albums/{album_id}/comments", response_model=List[schemas.AlbumComment])
-def read_comments_for_album(album_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_comments_for_album(album_id: str, response: Response, skip: int = 0, limit: int = 100,
+                            sort: Optional[str] = Query(None, description=COMMENT_SORT_DESCRIPTION),
+                            cursor: Optional[str] = None, db: Session = Depends(get_db)):
     db_album = crud.get_album(db, album_id=album_id)
     if db_album is None:
         raise HTTPException(status_code=404, detail="Album not found")
-    comments = crud.get_album_comments(db, album_id=album_id, skip=skip, limit=limit)
-    
-    # Convert datetime fields to strings
-    for comment in comments:
-        comment.created = convert_datetime_to_iso8601(comment.created)
-        comment.modified = convert_datetime_to_iso8601(comment.modified)
-    
-    return comments
+    return comment_listing(response, crud.get_album_comments, db=db, album_id=album_id, skip=skip, limit=limit,
+                           sort=sort, cursor=cursor)
 
 
 # Rating endpoints
@@ -479,8 +831,11 @@ def delete_song_comment(comment_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Comment not found")
     
     # Delete the comment
+    song_id = db_comment.song_id
     db.delete(db_comment)
+    crud.delete_comment_likes(db, "song", comment_id)
     db.commit()
+    top_comments.invalidate(models.SongComment, song_id)
     return {"message": "Comment deleted successfully"}
 
 
@@ -491,11 +846,36 @@ def delete_album_comment(comment_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Comment not found")
     
     # Delete the comment
+    album_id = db_comment.album_id
     db.delete(db_comment)
+    crud.delete_comment_likes(db, "album", comment_id)
     db.commit()
+    top_comments.invalidate(models.AlbumComment, album_id)
     return {"message": "Comment deleted successfully"}
 
 
+@app.post("/comments/{comment_type}/{comment_id}/like", response_model=schemas.LikeResult)
+def like_comment(comment_type: CommentType, comment_id: int,
+                 current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Like a comment as the logged-in user; liking it again adds nothing.
+
+    The like and its num_like increment are written right away, or with
+    LIKE_BUFFER enabled the request only reads and both are written on the
+    next flush.
+    """
+    like_buffer = likes.active_buffer()
+    if like_buffer is None:
+        liked = crud.like_comment(db, comment_type.value, comment_id, current_user.id)
+    else:
+        liked = crud.has_liked_comment(db, comment_type.value, comment_id, current_user.id)
+        if liked is not None:
+            liked = not liked and like_buffer.add(comment_type.value, comment_id, current_user.id)
+    if liked is None:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return {"id": comment_id, "added": int(liked), "buffered": like_buffer is not None}
+
+
 # Add this at the end of the file for running the app directly
 if __name__ == "__main__":
     import uvicorn
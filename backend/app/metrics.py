@@ -0,0 +1,334 @@
+"""
+Prometheus metrics for the API, aggregated across uvicorn workers.
+
+`MetricsMiddleware` counts requests per method, route template and status,
+keeps a latency histogram per route and an in-flight gauge. Collectors
+registered with `register_collector` add live state when metrics are read:
+DB pool usage, cache hits and misses, and password hashing latency.
+
+Each worker keeps its own numbers in memory. When METRICS_DIR is set, every
+worker also writes a snapshot of them to `METRICS_DIR/<pid>.json` every
+METRICS_FLUSH_INTERVAL seconds and on shutdown. `/metrics` then sums the
+snapshots of all workers, so whichever worker answers the scrape reports the
+whole server. No external service is involved. Counters and histograms of
+workers that have exited are kept; gauges only count live workers. Empty
+METRICS_DIR before starting the server, as the counters would otherwise
+carry over from the previous run.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .instrumentation import route_template
+
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+# name -> (type, help)
+METRICS = {
+    "http_requests_total": ("counter", "Requests handled, by method, route template and status"),
+    "http_request_duration_seconds": ("histogram", "Request latency, by method and route template"),
+    "http_requests_in_flight": ("gauge", "Requests being handled"),
+    "db_pool_size": ("gauge", "Configured size of the database connection pools"),
+    "db_pool_checked_out": ("gauge", "Database connections in use"),
+    "db_pool_overflow": ("gauge", "Database connections open beyond the pool size"),
+    "cache_hits_total": ("counter", "Cache lookups answered from the cache"),
+    "cache_misses_total": ("counter", "Cache lookups that missed"),
+    "cache_hit_ratio": ("gauge", "Hits over all lookups, since the server started"),
+    "password_hash_duration_seconds": ("histogram", "bcrypt hash/verify latency, by operation"),
+    "password_hash_in_flight": ("gauge", "Password hash/verify calls running or queued"),
+    "password_hash_rejected_total": ("counter", "Password hash/verify calls rejected with 503"),
+}
+
+
+def labels(**values) -> str:
+    """Render label values as the inside of a Prometheus label set."""
+    return ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in values.items()
+    )
+
+
+def empty_snapshot() -> dict:
+    # histograms: name -> labels -> {"bounds", "buckets" (per bucket, not cumulative), "sum"}
+    return {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+def merge(into: dict, snapshot: dict, gauges: bool = True) -> dict:
+    """Add the numbers of `snapshot` to `into`."""
+    kinds = ("counters", "gauges") if gauges else ("counters",)
+    for kind in kinds:
+        for name, samples in snapshot.get(kind, {}).items():
+            target = into[kind].setdefault(name, {})
+            for key, value in samples.items():
+                target[key] = target.get(key, 0) + value
+    for name, samples in snapshot.get("histograms", {}).items():
+        target = into["histograms"].setdefault(name, {})
+        for key, histogram in samples.items():
+            if key not in target:
+                target[key] = {"bounds": list(histogram["bounds"]),
+                               "buckets": [0] * len(histogram["buckets"]), "sum": 0.0}
+            merged = target[key]
+            merged["buckets"] = [a + b for a, b in zip(merged["buckets"], histogram["buckets"])]
+            merged["sum"] += histogram["sum"]
+    return into
+
+
+class RequestMetrics:
+    """Request counts, latency histograms and the in-flight gauge of this process."""
+
+    def __init__(self, buckets=REQUEST_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[str, int] = {}
+        self.durations: Dict[str, dict] = {}
+
+    def started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method: str, route: str, status_code: int, seconds: float) -> None:
+        request_key = labels(method=method, route=route, status=status_code)
+        duration_key = labels(method=method, route=route)
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[request_key] = self.requests.get(request_key, 0) + 1
+            histogram = self.durations.get(duration_key)
+            if histogram is None:
+                histogram = self.durations[duration_key] = {
+                    "bounds": list(self.buckets), "buckets": [0] * len(self.buckets), "sum": 0.0
+                }
+            histogram["sum"] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": {"http_requests_total": dict(self.requests)},
+                "gauges": {"http_requests_in_flight": {"": self.in_flight}},
+                "histograms": {"http_request_duration_seconds": {
+                    key: {"bounds": h["bounds"], "buckets": list(h["buckets"]), "sum": h["sum"]}
+                    for key, h in self.durations.items()
+                }},
+            }
+
+
+request_metrics = RequestMetrics()
+_collectors: List[Callable[[], dict]] = []
+
+
+def register_collector(collector: Callable[[], dict]) -> None:
+    """Add a function returning a snapshot of live state, called whenever metrics are read."""
+    _collectors.append(collector)
+
+
+def pool_collector(engine) -> Callable[[], dict]:
+    pool = engine.pool
+
+    def collect() -> dict:
+        snapshot = empty_snapshot()
+        # Only QueuePool reports sizes; other pools (e.g. SQLite's) are skipped
+        if hasattr(pool, "size") and hasattr(pool, "checkedout"):
+            snapshot["gauges"] = {
+                "db_pool_size": {"": pool.size()},
+                "db_pool_checked_out": {"": pool.checkedout()},
+                "db_pool_overflow": {"": max(pool.overflow(), 0)},
+            }
+        return snapshot
+
+    return collect
+
+
+def cache_collector(caches: Dict[str, object]) -> Callable[[], dict]:
+    """Hits and misses of caches exposing `hits` and `misses` counts."""
+
+    def collect() -> dict:
+        snapshot = empty_snapshot()
+        snapshot["counters"] = {
+            "cache_hits_total": {labels(cache=name): cache.hits for name, cache in caches.items()},
+            "cache_misses_total": {labels(cache=name): cache.misses for name, cache in caches.items()},
+        }
+        return snapshot
+
+    return collect
+
+
+def password_hash_collector(hasher) -> Callable[[], dict]:
+    def collect() -> dict:
+        state = hasher.metrics.snapshot()
+        snapshot = empty_snapshot()
+        snapshot["gauges"] = {"password_hash_in_flight": {"": state["in_flight"]}}
+        snapshot["counters"] = {"password_hash_rejected_total": {"": state["rejected"]}}
+        snapshot["histograms"] = {"password_hash_duration_seconds": {
+            labels(operation=operation): {
+                "bounds": [float(bound) for bound in stats["buckets"]],
+                "buckets": list(stats["buckets"].values()),
+                "sum": stats["total_seconds"],
+            }
+            for operation, stats in state["operations"].items()
+        }}
+        return snapshot
+
+    return collect
+
+
+def local_snapshot() -> dict:
+    """Everything this process knows, including its collectors."""
+    snapshot = merge(empty_snapshot(), request_metrics.snapshot())
+    for collector in _collectors:
+        merge(snapshot, collector())
+    snapshot["pid"] = os.getpid()
+    return snapshot
+
+
+def write_snapshot(directory: str = None) -> None:
+    """Write this process's snapshot to the shared directory (atomically)."""
+    directory = directory or METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    snapshot = local_snapshot()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, os.path.join(directory, f"{snapshot['pid']}.json"))
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect() -> dict:
+    """Metrics of the whole server: all workers when METRICS_DIR is set, this process otherwise."""
+    if not METRICS_DIR:
+        totals = local_snapshot()
+    else:
+        write_snapshot()
+        totals = empty_snapshot()
+        for filename in os.listdir(METRICS_DIR):
+            if not filename.endswith(".json") or filename.startswith("."):
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            merge(totals, snapshot, gauges=_alive(snapshot.get("pid", 0)))
+
+    hits = totals["counters"].get("cache_hits_total", {})
+    misses = totals["counters"].get("cache_misses_total", {})
+    totals["gauges"]["cache_hit_ratio"] = {
+        key: hits[key] / (hits[key] + misses.get(key, 0))
+        for key in hits if hits[key] + misses.get(key, 0)
+    }
+    return totals
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot: dict) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        samples = snapshot["histograms" if kind == "histogram" else kind + "s"].get(name)
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in sorted(samples):
+            label_set = f"{{{key}}}" if key else ""
+            if kind != "histogram":
+                lines.append(f"{name}{label_set} {_format(samples[key])}")
+                continue
+            histogram = samples[key]
+            cumulative = 0
+            for bound, count in zip(histogram["bounds"], histogram["buckets"]):
+                cumulative += count
+                le = (key + "," if key else "") + f'le="{_format(bound)}"'
+                lines.append(f"{name}_bucket{{{le}}} {cumulative}")
+            lines.append(f"{name}_sum{label_set} {_format(histogram['sum'])}")
+            lines.append(f"{name}_count{label_set} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Count requests and time them per route template."""
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.metrics.started()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.finished(scope["method"], route_template(scope), status_code,
+                                  time.perf_counter() - started)
+
+
+class _SnapshotWriter:
+    def __init__(self, directory: str, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            write_snapshot(self.directory)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        write_snapshot(self.directory)
+
+
+_writer: Optional[_SnapshotWriter] = None
+
+
+def start() -> None:
+    """Start writing this worker's snapshot to METRICS_DIR."""
+    global _writer
+    if _writer is None and METRICS_DIR:
+        _writer = _SnapshotWriter(METRICS_DIR, METRICS_FLUSH_INTERVAL)
+
+
+def stop() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
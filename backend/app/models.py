@@ -1,11 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, ForeignKey, Text, Table, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Date, ForeignKey, Text, Table, DateTime, Index
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 from datetime import date, datetime
 
+from .textstore import CompressedText
+
 Base = declarative_base()
 
+# Size of MySQL MEDIUMBLOB, used for compressed meta text
+MEDIUM_TEXT_LENGTH = 2 ** 24 - 1
+
 # Association Tables for Many-to-Many relationships
 artist_genre_link = Table(
     'artist_genre_link',
@@ -41,7 +46,7 @@ class Genre(Base):
     __tablename__ = 'genres'
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), index=True)
-    info: Mapped[str] = mapped_column(Text)
+    info: Mapped[str] = mapped_column(Text, deferred=True)
     
     # Relationships
     artists = relationship("Artist", secondary=artist_genre_link, back_populates="genres")
@@ -98,7 +103,7 @@ class Song(Base):
 class SongMeta(Base):
     __tablename__ = 'song_meta'
     song_id: Mapped[str] = mapped_column(String(20), ForeignKey('songs.song_id'), primary_key=True)
-    lyrics: Mapped[str] = mapped_column(Text)
+    lyrics: Mapped[str] = mapped_column(CompressedText(length=MEDIUM_TEXT_LENGTH), deferred=True)
     
     # Relationships
     song = relationship("Song", back_populates="meta")
@@ -107,7 +112,7 @@ class SongMeta(Base):
 class ArtistMeta(Base):
     __tablename__ = 'artist_meta'
     artist_id: Mapped[str] = mapped_column(String(20), ForeignKey('artists.artist_id'), primary_key=True)
-    info: Mapped[str] = mapped_column(Text)
+    info: Mapped[str] = mapped_column(CompressedText(length=MEDIUM_TEXT_LENGTH), deferred=True)
     pic_address: Mapped[str] = mapped_column(String(255))
     
     # Relationships
@@ -117,7 +122,7 @@ class ArtistMeta(Base):
 class AlbumMeta(Base):
     __tablename__ = 'album_meta'
     album_id: Mapped[str] = mapped_column(String(20), ForeignKey('albums.album_id'), primary_key=True)
-    info: Mapped[str] = mapped_column(Text)
+    info: Mapped[str] = mapped_column(CompressedText(length=MEDIUM_TEXT_LENGTH), deferred=True)
     pic_address: Mapped[str] = mapped_column(String(255))
     
     # Relationships
@@ -142,8 +147,40 @@ class User(Base):
     album_comments = relationship("AlbumComment", back_populates="user")
 
 
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+    # One row per login: refreshing bumps `generation` instead of adding a row
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), index=True)
+    nonce: Mapped[str] = mapped_column(String(64))
+    generation: Mapped[int] = mapped_column(Integer, default=0)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+class CommentLike(Base):
+    __tablename__ = 'comment_likes'
+    # One like per user per comment; comment_type is "song", "artist" or "album"
+    comment_type: Mapped[str] = mapped_column(String(10), primary_key=True)
+    comment_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
+
+
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
+    # Single row (id 1), bumped by every catalog write so snapshot workers notice each other's writes
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
 class SongComment(Base, BaseModel):
     __tablename__ = 'song_comments'
+    # Keyset indexes for the sorted comment listings and the user activity feed
+    __table_args__ = (
+        Index('ix_song_comments_song_id_num_like', 'song_id', 'num_like', 'id'),
+        Index('ix_song_comments_song_id_created', 'song_id', 'created', 'id'),
+        Index('ix_song_comments_user_id_created', 'user_id', 'created', 'id'),
+        Index('ix_song_comments_song_id_star', 'song_id', 'star', 'id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     song_id: Mapped[str] = mapped_column(String(20), ForeignKey('songs.song_id'))
     comment: Mapped[str] = mapped_column(String(255))
@@ -158,6 +195,12 @@ class SongComment(Base, BaseModel):
 
 class ArtistComment(Base, BaseModel):
     __tablename__ = 'artist_comments'
+    # Keyset indexes for the sorted comment listings and the user activity feed
+    __table_args__ = (
+        Index('ix_artist_comments_artist_id_num_like', 'artist_id', 'num_like', 'id'),
+        Index('ix_artist_comments_artist_id_created', 'artist_id', 'created', 'id'),
+        Index('ix_artist_comments_user_id_created', 'user_id', 'created', 'id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     artist_id: Mapped[str] = mapped_column(String(20), ForeignKey('artists.artist_id'))
     comment: Mapped[str] = mapped_column(String(255))
@@ -172,6 +215,13 @@ class ArtistComment(Base, BaseModel):
 
 class AlbumComment(Base, BaseModel):
     __tablename__ = 'album_comments'
+    # Keyset indexes for the sorted comment listings and the user activity feed
+    __table_args__ = (
+        Index('ix_album_comments_album_id_num_like', 'album_id', 'num_like', 'id'),
+        Index('ix_album_comments_album_id_created', 'album_id', 'created', 'id'),
+        Index('ix_album_comments_user_id_created', 'user_id', 'created', 'id'),
+        Index('ix_album_comments_album_id_star', 'album_id', 'star', 'id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     album_id: Mapped[str] = mapped_column(String(20), ForeignKey('albums.album_id'))
     comment: Mapped[str] = mapped_column(String(255))
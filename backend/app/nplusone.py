@@ -0,0 +1,136 @@
+"""
+N+1 query detection.
+
+`NPlusOneMiddleware` gives each request a counter of statement shapes, and
+the engine listener installed by `instrument_engine` fingerprints every
+statement run during the request: literals are replaced with `?` and IN
+lists are collapsed, so `get_song_rating` for ten songs, or ten lazy loads of
+`Song.artists`, count as one shape run ten times.
+
+When a shape runs more than NPLUSONE_THRESHOLD times in one request,
+NPLUSONE_MODE decides what happens:
+
+- `warn` (default): when the request finishes, one warning per offending
+  shape is logged on the `app.nplusone` logger. It gives the route, the
+  count, the fingerprint and the call site: the innermost frame in the app
+  package that ran the statement, or the innermost frame outside SQLAlchemy
+  (e.g. pydantic, for a lazy load during serialization).
+- `raise`: `NPlusOneDetected` is raised before the offending statement runs,
+  so the request fails. Use it in tests.
+- `off`: nothing is tracked.
+"""
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+import sqlalchemy
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .instrumentation import route_template
+
+NPLUSONE_MODE = os.getenv("NPLUSONE_MODE", "warn").lower()
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "10"))
+
+logger = logging.getLogger(__name__)
+
+_THIS_FILE = os.path.abspath(__file__)
+_APP_DIR = os.path.dirname(_THIS_FILE)
+_SQLALCHEMY_DIR = os.path.dirname(os.path.abspath(sqlalchemy.__file__))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s)(?:\s*,\s*(?:\?|%s|%\(\w+\)s))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NPlusOneDetected(Exception):
+    """A statement shape ran more than NPLUSONE_THRESHOLD times in one request."""
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Normalize a statement to its shape: literals become `?`, IN lists `(?)`."""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def call_site() -> str:
+    """file:line of the code that ran the current statement."""
+    outside_sqlalchemy = None
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename == _THIS_FILE or filename.startswith(_SQLALCHEMY_DIR):
+            continue
+        location = f"{os.path.relpath(filename, os.path.dirname(_APP_DIR))}:{frame.lineno} in {frame.name}"
+        if filename.startswith(_APP_DIR):
+            return location
+        if outside_sqlalchemy is None:
+            outside_sqlalchemy = location
+    return outside_sqlalchemy or "unknown"
+
+
+class _RequestQueries:
+    __slots__ = ("scope", "counts", "call_sites")
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.counts = Counter()
+        # fingerprint -> call site of the run that crossed the threshold
+        self.call_sites = {}
+
+
+_current_queries: ContextVar[Optional[_RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def instrument_engine(engine) -> None:
+    """Count statement shapes per request and flag the ones that repeat."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries = _current_queries.get()
+        if queries is None:
+            return
+        shape = fingerprint(statement)
+        queries.counts[shape] += 1
+        if queries.counts[shape] != NPLUSONE_THRESHOLD + 1:
+            return
+        site = call_site()
+        if NPLUSONE_MODE == "raise":
+            raise NPlusOneDetected(
+                f"{route_template(queries.scope)}: statement ran more than {NPLUSONE_THRESHOLD} times "
+                f"from {site}: {shape}"
+            )
+        queries.call_sites[shape] = site
+
+
+class NPlusOneMiddleware:
+    """Track statement shapes for each request and report repeats when it finishes."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or NPLUSONE_MODE == "off":
+            await self.app(scope, receive, send)
+            return
+
+        queries = _RequestQueries(scope)
+        token = _current_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_queries.reset(token)
+            for shape, site in queries.call_sites.items():
+                logger.warning(
+                    "Possible N+1 on %s %s: statement ran %d times (threshold %d) from %s: %s",
+                    scope["method"], route_template(scope), queries.counts[shape],
+                    NPLUSONE_THRESHOLD, site, shape,
+                )
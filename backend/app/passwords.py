@@ -0,0 +1,136 @@
+"""
+Bounded executor for bcrypt password hashing and verification.
+
+bcrypt takes a few hundred milliseconds of CPU per call, so it never runs on
+the event loop or in the request threadpool. Calls go to a dedicated pool of
+PASSWORD_HASH_WORKERS threads (bcrypt releases the GIL while it works). At
+most PASSWORD_HASH_MAX_QUEUE calls may wait for a worker; beyond that
+`PasswordHasherBusy` is raised straight away, and the API answers 503 with a
+Retry-After header instead of letting a login storm queue up behind itself.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+
+from .utils import get_password_hash, verify_password
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hash/verify calls are already waiting for a worker."""
+
+
+class HashMetrics:
+    """Latency histograms per operation plus in-flight and rejected counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.count: Dict[str, int] = {}
+        self.total_seconds: Dict[str, float] = {}
+        self.max_seconds: Dict[str, float] = {}
+        self.buckets: Dict[str, list] = {}
+
+    def enter(self, limit: int) -> None:
+        """Count a call in flight, or count it rejected and raise PasswordHasherBusy at `limit`."""
+        with self._lock:
+            if self.in_flight >= limit:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.in_flight += 1
+
+    def leave(self) -> None:
+        """Count an in-flight call as finished."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            if operation not in self.count:
+                self.count[operation] = 0
+                self.total_seconds[operation] = 0.0
+                self.max_seconds[operation] = 0.0
+                self.buckets[operation] = [0] * len(LATENCY_BUCKETS)
+            self.count[operation] += 1
+            self.total_seconds[operation] += seconds
+            self.max_seconds[operation] = max(self.max_seconds[operation], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[operation][i] += 1
+                    break
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "workers": PASSWORD_HASH_WORKERS,
+                "max_queue": PASSWORD_HASH_MAX_QUEUE,
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+                "operations": {
+                    operation: {
+                        "count": self.count[operation],
+                        "total_seconds": self.total_seconds[operation],
+                        "max_seconds": self.max_seconds[operation],
+                        "buckets": dict(zip(
+                            [str(bound) for bound in LATENCY_BUCKETS],
+                            self.buckets[operation]
+                        )),
+                    }
+                    for operation in self.count
+                },
+            }
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.metrics = HashMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def _submit(self, operation: str, fn, *args) -> Future:
+        metrics = self.metrics
+        metrics.enter(self.workers + self.max_queue)
+
+        def run():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                metrics.observe(operation, time.perf_counter() - started)
+
+        try:
+            future = self._executor.submit(run)
+        except BaseException:
+            metrics.leave()
+            raise
+
+        future.add_done_callback(lambda _: metrics.leave())
+        return future
+
+    # Blocking versions, for sync code running in the request threadpool
+    def hash(self, password: str) -> str:
+        return self._submit("hash", get_password_hash, password).result()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._submit("verify", verify_password, password, hashed).result()
+
+    # Awaitable versions, for async handlers
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit("hash", get_password_hash, password))
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(self._submit("verify", verify_password, password, hashed))
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,241 @@
+"""
+On-demand profiling of single requests.
+
+When PROFILE_TOKEN is set, a request sent with `X-Profile: <PROFILE_TOKEN>`
+is profiled by a stack sampler while it runs. Every PROFILE_SAMPLE_INTERVAL_MS,
+a background thread records the stacks of the threads working on that
+request:
+
+- the event loop thread, while the request's task is the one running;
+- the threadpool worker running its sync endpoint or dependencies. These
+  are found through the context anyio copies into the worker.
+
+Other requests running at the same time are left out. So is work handed to
+other executors, such as bcrypt in the password hashing pool; it shows up as
+the request waiting for it.
+
+The profile is written to PROFILE_DIR, as speedscope JSON by default or as
+a pstats file with `X-Profile-Format: pstats`. Its name is returned in the
+`X-Profile-File` response header, and admins can download it from
+GET /admin/profiles/{name}. The response itself is unchanged.
+
+The middleware is only installed when PROFILE_TOKEN is set. Even then, a
+request without the header costs one scan of its header list.
+"""
+import asyncio
+import hmac
+import json
+import marshal
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextvars import Context, ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .instrumentation import route_template
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "xiamiu-profiles"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+
+PROFILE_FORMATS = {"speedscope": ".speedscope.json", "pstats": ".pstats"}
+PROFILE_NAME = re.compile(r"^[\w.-]+$")
+
+# (filename, first line, function name), the key pstats uses for a function
+FrameKey = Tuple[str, int, str]
+
+_QUEUE_GET = queue.Queue.get.__code__
+
+_current_session: ContextVar[Optional["_Session"]] = ContextVar("profile_session", default=None)
+
+
+class _Session:
+    """Stacks sampled for one request, per thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task, loop_thread: int,
+                 interval: float):
+        self.loop = loop
+        self.task = task
+        self.loop_thread = loop_thread
+        self.interval = interval
+        # thread id -> list of (stack root first, seconds)
+        self.samples: Dict[int, List[Tuple[Tuple[FrameKey, ...], float]]] = {}
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _works_for_request(self, thread_id: int, frame) -> bool:
+        if thread_id == self.loop_thread:
+            return asyncio.current_task(self.loop) is self.task
+        # anyio's worker keeps the copied request context in a local named
+        # `context`; the frame it called is the job, unless it is idle in queue.get.
+        # anyio is pinned in requirements.txt, and tests/test_profiling.py fails
+        # if an upgrade renames either
+        called = None
+        while frame is not None:
+            if frame.f_code.co_name == "run" and "context" in frame.f_code.co_varnames:
+                context = frame.f_locals.get("context")
+                if isinstance(context, Context):
+                    return (called is not None and called.f_code is not _QUEUE_GET
+                            and context.get(_current_session) is self)
+            called, frame = frame, frame.f_back
+        return False
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or not self._works_for_request(thread_id, frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(thread_id, []).append((tuple(stack), elapsed))
+
+    def speedscope(self, name: str) -> dict:
+        frames: List[dict] = []
+        index: Dict[FrameKey, int] = {}
+        profiles = []
+        for thread_id, samples in self.samples.items():
+            stacks = []
+            for stack, _ in samples:
+                for key in stack:
+                    if key not in index:
+                        index[key] = len(frames)
+                        frames.append({"name": key[2], "file": key[0], "line": key[1]})
+                stacks.append([index[key] for key in stack])
+            weights = [seconds for _, seconds in samples]
+            profiles.append({
+                "type": "sampled",
+                "name": "event loop" if thread_id == self.loop_thread else f"worker thread {thread_id}",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": stacks,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "xiamiu-api",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def pstats(self) -> dict:
+        """Samples as the marshalled dict pstats.Stats loads; call counts are sample counts."""
+        stats: Dict[FrameKey, list] = {}
+
+        def entry(key):
+            if key not in stats:
+                stats[key] = [0, 0, 0.0, 0.0, {}]
+            return stats[key]
+
+        for samples in self.samples.values():
+            for stack, seconds in samples:
+                seen = set()
+                for depth, key in enumerate(stack):
+                    func = entry(key)
+                    if key not in seen:
+                        seen.add(key)
+                        func[0] += 1
+                        func[1] += 1
+                        func[3] += seconds
+                    if depth == len(stack) - 1:
+                        func[2] += seconds
+                    if depth:
+                        caller = stack[depth - 1]
+                        nc, cc, tt, ct = func[4].get(caller, (0, 0, 0.0, 0.0))
+                        own = seconds if depth == len(stack) - 1 else 0.0
+                        func[4][caller] = (nc + 1, cc + 1, tt + own, ct + seconds)
+        return {key: tuple(value) for key, value in stats.items()}
+
+
+def _requested(scope: Scope) -> Optional[str]:
+    """The profile format asked for, if the request carries a valid X-Profile token."""
+    token = None
+    profile_format = "speedscope"
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            token = value
+        elif name == b"x-profile-format":
+            profile_format = value.decode("latin-1").strip().lower()
+    if token is None or not hmac.compare_digest(token, PROFILE_TOKEN.encode()):
+        return None
+    return profile_format if profile_format in PROFILE_FORMATS else "speedscope"
+
+
+def _save(session: _Session, path: str, profile_format: str, title: str) -> None:
+    """Stop the sampler and write the profile; runs on a worker thread, off the event loop."""
+    session.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if profile_format == "pstats":
+        with open(path, "wb") as f:
+            marshal.dump(session.pstats(), f)
+    else:
+        with open(path, "w") as f:
+            json.dump(session.speedscope(f"{title} ({session.duration * 1000:.1f} ms)"), f)
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a stored profile, or None if the name is invalid or unknown."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """Profile requests that carry the X-Profile token."""
+
+    def __init__(self, app: ASGIApp, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.app = app
+        self.interval = interval_ms / 1000
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profile_format = _requested(scope) if scope["type"] == "http" else None
+        if profile_format is None:
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}{PROFILE_FORMATS[profile_format]}"
+        session = _Session(asyncio.get_running_loop(), asyncio.current_task(),
+                           threading.get_ident(), self.interval)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message.setdefault("headers", [])).append("X-Profile-File", name)
+            await send(message)
+
+        token = _current_session.set(session)
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_session.reset(token)
+            await anyio.to_thread.run_sync(_save, session, os.path.join(PROFILE_DIR, name), profile_format,
+                                           f"{scope['method']} {route_template(scope)}")
@@ -1,6 +1,14 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, PlainSerializer, validator
 from typing import Optional, List, Dict
-from datetime import date
+from typing_extensions import Annotated
+from datetime import date, datetime
+
+from .utils import convert_datetime_to_iso8601
+
+
+# Datetimes are serialized to ISO 8601 strings on the way out, so handlers can
+# return ORM rows as-is instead of rewriting their timestamp attributes
+IsoDatetime = Annotated[datetime, PlainSerializer(convert_datetime_to_iso8601, return_type=str)]
 
 
 # Genre schemas
@@ -21,6 +29,20 @@ class Genre(GenreBase):
     }
 
 
+GENRE_SUMMARY_LENGTH = 160
+
+
+class GenreSummary(BaseModel):
+    """Genre for menus and lists: `summary` is the start of `info`, not the full text."""
+    id: int
+    name: str
+    summary: Optional[str] = None
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
 # Artist schemas
 class ArtistBase(BaseModel):
     name: str
@@ -83,6 +105,17 @@ class Song(SongBase):
     }
 
 
+class ArtistSong(Song):
+    album_name: str
+    release_date: date
+    featured: bool = Field(description="True when the song is on another artist's album")
+
+
+class ArtistSongPage(BaseModel):
+    songs: List[ArtistSong] = []
+    next_cursor: Optional[str] = None
+
+
 # Meta schemas
 class SongMetaBase(BaseModel):
     lyrics: str
@@ -149,6 +182,35 @@ class UserCreate(UserBase):
     password: str
 
 
+# Bulk user import schemas
+MAX_IMPORT_USERS = 10000
+
+
+class UserImportItem(UserBase):
+    password: Optional[str] = Field(None, description="Plaintext password, hashed during the import")
+    password_hash: Optional[str] = Field(None, description="Existing bcrypt hash, stored as-is")
+
+
+class UserImport(BaseModel):
+    users: List[UserImportItem] = Field(..., max_length=MAX_IMPORT_USERS)
+
+
+class UserImportRejection(BaseModel):
+    index: int
+    user_name: str
+    reason: str
+
+
+class UserImportResult(BaseModel):
+    imported: int
+    skipped_existing: int
+    hashed: int
+    prehashed: int
+    rejected: List[UserImportRejection] = []
+    seconds: float
+    users_per_second: float
+
+
 class User(UserBase):
     id: int
 
@@ -182,8 +244,8 @@ class SongComment(SongCommentBase):
     id: int
     song_id: str
     user_id: int
-    created: str
-    modified: str
+    created: IsoDatetime
+    modified: IsoDatetime
 
     model_config = {
         "from_attributes": True
@@ -213,8 +275,8 @@ class ArtistComment(ArtistCommentBase):
     id: int
     artist_id: str
     user_id: int
-    created: str
-    modified: str
+    created: IsoDatetime
+    modified: IsoDatetime
 
     model_config = {
         "from_attributes": True
@@ -240,8 +302,8 @@ class AlbumComment(AlbumCommentBase):
     id: int
     album_id: str
     user_id: int
-    created: str
-    modified: str
+    created: IsoDatetime
+    modified: IsoDatetime
 
     model_config = {
         "from_attributes": True
@@ -252,6 +314,15 @@ class AlbumComment(AlbumCommentBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class RevokeTokenRequest(RefreshTokenRequest):
+    all_sessions: bool = Field(False, description="Revoke every refresh token of the user, not just this login")
 
 
 class TokenData(BaseModel):
@@ -270,6 +341,85 @@ class SearchResponse(BaseModel):
     songs: List[Song] = []
 
 
+# Multi-get schemas
+MAX_BATCH_IDS = 1000
+
+
+class BatchIds(BaseModel):
+    ids: List[str] = Field(..., max_length=MAX_BATCH_IDS)
+
+
+class SongBatch(BaseModel):
+    songs: List[Song] = []
+    missing: List[str] = []
+
+
+class AlbumBatch(BaseModel):
+    albums: List[Album] = []
+    missing: List[str] = []
+
+
+class ArtistBatch(BaseModel):
+    artists: List[Artist] = []
+    missing: List[str] = []
+
+
+# Bulk create schemas
+MAX_BULK_ITEMS = 10000
+
+
+class SongArtistLinkCreate(BaseModel):
+    song_id: str
+    artist_id: str
+
+
+class AlbumGenreLinkCreate(BaseModel):
+    album_id: str
+    genre_id: int
+
+
+class ArtistGenreLinkCreate(BaseModel):
+    artist_id: str
+    genre_id: int
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: str
+    status: str = Field(description="created, duplicate or missing_reference")
+    detail: Optional[str] = None
+
+
+class BulkCreateResult(BaseModel):
+    created: int
+    items: List[BulkItemResult] = []
+
+
+# Activity feed schemas
+class ActivityItem(BaseModel):
+    """One of a user's comments on a song, artist or album."""
+    type: str = Field(description="song, artist or album")
+    id: int
+    target_id: str = Field(description="Id of the commented song, artist or album")
+    comment: str
+    num_like: int = 0
+    star: Optional[int] = None
+    created: IsoDatetime
+    modified: IsoDatetime
+
+
+class ActivityPage(BaseModel):
+    activity: List[ActivityItem] = []
+    next_cursor: Optional[str] = None
+
+
+# Like schemas
+class LikeResult(BaseModel):
+    id: int
+    added: int = Field(description="1 for a new like, 0 when the user had already liked the comment")
+    buffered: bool = Field(description="True when the likes were queued for the next flush rather than written")
+
+
 # Rating schemas
 class SongRating(BaseModel):
     song_id: str
@@ -290,3 +440,46 @@ class AlbumRating(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+
+# Composite page schemas
+class AlbumPage(BaseModel):
+    album: Album
+    artist: Artist
+    meta: Optional[AlbumMeta] = None
+    genres: List[GenreSummary] = []
+    songs: List[Song] = []
+    rating: AlbumRating
+    songs_rating: AlbumRating
+    comments: List[AlbumComment] = []
+
+
+class ArtistPageAlbum(BaseModel):
+    album: Album
+    rating: AlbumRating
+
+
+class ArtistPage(BaseModel):
+    artist: Artist
+    meta: Optional[ArtistMeta] = None
+    genres: List[GenreSummary] = []
+    albums: List[ArtistPageAlbum] = []
+    comments: List[ArtistComment] = []
+
+
+# Slow statement log schemas
+class SlowQuery(BaseModel):
+    fingerprint: str
+    count: int
+    total_ms: float
+    max_ms: float
+    last_route: str
+    first_seen: IsoDatetime
+    last_seen: IsoDatetime
+    explain: Optional[List[Dict]] = None
+
+
+class SlowQueryReport(BaseModel):
+    threshold_ms: float
+    suppressed_log_lines: int
+    statements: List[SlowQuery] = []
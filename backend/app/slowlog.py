@@ -0,0 +1,215 @@
+"""
+Slow statement log with optional EXPLAIN capture.
+
+Statements that take at least SLOW_QUERY_THRESHOLD_MS in the driver are
+logged on the `app.slowlog` logger. Each line gives the duration, the route
+of the request that ran the statement, and the statement itself. Literals
+in the statement are replaced with `?` and the bound parameters are not
+logged, only their count. At most SLOW_QUERY_LOG_PER_MINUTE lines are
+written per minute; the rest are only counted.
+
+Every slow statement is also added, by fingerprint (see `nplusone.fingerprint`),
+to a rolling table of count, total and max duration and last route. Entries
+not seen for SLOW_QUERY_WINDOW seconds are dropped. `top(n)` returns the
+worst fingerprints, served by GET /admin/slow-queries.
+
+With SLOW_QUERY_EXPLAIN=true, slow SELECTs are also run through EXPLAIN on a
+separate connection, in a background thread, at most once per fingerprint
+per SLOW_QUERY_EXPLAIN_INTERVAL seconds. The plan is logged and kept with the
+fingerprint's entry.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .instrumentation import route_template
+from .nplusone import fingerprint
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG_PER_MINUTE = int(os.getenv("SLOW_QUERY_LOG_PER_MINUTE", "60"))
+SLOW_QUERY_WINDOW = float(os.getenv("SLOW_QUERY_WINDOW", "3600"))
+SLOW_QUERY_MAX_FINGERPRINTS = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", "1000"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+
+logger = logging.getLogger(__name__)
+
+_current_scope: ContextVar[Optional[Scope]] = ContextVar("slowlog_scope", default=None)
+
+
+def current_route() -> str:
+    scope = _current_scope.get()
+    return route_template(scope) if scope is not None else "background"
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` events a minute, in bursts of up to that many."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(per_minute, 0)
+        self.tokens = float(self.capacity)
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class SlowQueryLog:
+    """Rolling per-fingerprint totals of slow statements."""
+
+    def __init__(self, window: float = SLOW_QUERY_WINDOW, max_fingerprints: int = SLOW_QUERY_MAX_FINGERPRINTS):
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def record(self, shape: str, duration_ms: float, route: str) -> dict:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self._prune(now)
+                entry = self._entries[shape] = {
+                    "fingerprint": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "last_route": route, "first_seen": now, "last_seen": now,
+                    "explain": None, "explained_at": 0.0,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_route"] = route
+            entry["last_seen"] = now
+            return entry
+
+    def note_suppressed(self) -> None:
+        """Count a slow statement whose log line was rate limited."""
+        with self._lock:
+            self.suppressed += 1
+
+    def claim_explain(self, entry: dict, interval: float) -> bool:
+        """Whether this fingerprint is due for a new EXPLAIN; marks it as explained if so."""
+        now = time.time()
+        with self._lock:
+            if now - entry["explained_at"] < interval:
+                return False
+            entry["explained_at"] = now
+            return True
+
+    def set_explain(self, entry: dict, plan: List[dict]) -> None:
+        with self._lock:
+            entry["explain"] = plan
+
+    def top(self, n: int = 20) -> List[dict]:
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            entries = sorted(self._entries.values(), key=lambda entry: entry["total_ms"], reverse=True)[:n]
+            return [
+                {key: value for key, value in entry.items() if key != "explained_at"}
+                for entry in entries
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        for shape in [shape for shape, entry in self._entries.items() if entry["last_seen"] < cutoff]:
+            del self._entries[shape]
+        # Still full: drop the cheapest fingerprints
+        overflow = len(self._entries) - self.max_fingerprints + 1
+        if overflow > 0:
+            for shape in sorted(self._entries, key=lambda shape: self._entries[shape]["total_ms"])[:overflow]:
+                del self._entries[shape]
+
+
+slow_queries = SlowQueryLog()
+_log_limiter = RateLimiter(SLOW_QUERY_LOG_PER_MINUTE)
+_explain_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _explain(engine, statement: str, parameters, entry: dict) -> None:
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(slow_query_log=False).exec_driver_sql(prefix + statement, parameters)
+            plan = [dict(row._mapping) for row in result]
+    except Exception:
+        logger.exception("EXPLAIN failed for slow statement: %s", entry["fingerprint"])
+        return
+    slow_queries.set_explain(entry, plan)
+    logger.warning("EXPLAIN for slow statement %s: %s", entry["fingerprint"], plan)
+
+
+def instrument_engine(engine, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, explain: bool = SLOW_QUERY_EXPLAIN) -> None:
+    """Time every statement on `engine` and report the ones slower than `threshold_ms`."""
+    global _explain_executor
+    if threshold_ms <= 0:
+        return
+    if explain and _explain_executor is None:
+        _explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._slowlog_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_slowlog_started", None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < threshold_ms or context.execution_options.get("slow_query_log") is False:
+            return
+
+        shape = fingerprint(statement)
+        route = current_route()
+        entry = slow_queries.record(shape, duration_ms, route)
+        if _log_limiter.allow():
+            parameter_count = len(parameters) if isinstance(parameters, (list, tuple, dict)) else 0
+            logger.warning(
+                "Slow statement (%.1f ms) on %s, %d parameters redacted%s: %s",
+                duration_ms, route, parameter_count, ", executemany" if executemany else "", shape,
+            )
+        else:
+            slow_queries.note_suppressed()
+
+        if (explain and not executemany and shape.lstrip().upper().startswith("SELECT")
+                and slow_queries.claim_explain(entry, SLOW_QUERY_EXPLAIN_INTERVAL)):
+            _explain_executor.submit(_explain, engine, statement, parameters, entry)
+
+
+class SlowQueryMiddleware:
+    """Make the request's route available to the slow statement log."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
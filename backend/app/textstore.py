@@ -0,0 +1,171 @@
+"""
+Compressed storage for large text columns (lyrics and bios).
+
+The columns are binary (MEDIUMBLOB, migration 005) whatever TEXT_COMPRESSION
+is set to; only the format of newly written values depends on it. Stored
+values are one of:
+
+- plain UTF-8 text, as written with TEXT_COMPRESSION=none (the default) and
+  as stored before migration 005;
+- 0xF5 marker, then CRC-32 and length (little endian, 4 bytes each) of the
+  payload, then a raw deflate stream of the payload that is sync-flushed
+  but never finished. The payload is the text encoded as a JSON string
+  literal, so the stream can be spliced as-is into a gzip encoded JSON
+  response (see `gzip_json_with_stored_field`);
+- 0xF6 marker, then zstd-compressed UTF-8 text (requires the zstandard
+  package).
+
+The marker bytes never occur in UTF-8, so plain text can't be mistaken for a
+compressed value. TEXT_COMPRESSION selects the format used for writes:
+"none", "zlib" or "zstd".
+"""
+import json
+import os
+import struct
+import zlib
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "none").lower()
+ZLIB_LEVEL = int(os.getenv("ZLIB_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+# Bytes that are invalid anywhere in UTF-8
+MARKER_DEFLATE = 0xF5
+MARKER_ZSTD = 0xF6
+
+_DEFLATE_HEADER = struct.Struct("<II")
+# gzip member header: magic, deflate method, no flags, no mtime, no extra flags, unknown OS
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def _deflate(data: bytes, final: bool) -> bytes:
+    compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def encode_text(text: str, compression: str = None) -> bytes:
+    """Encode text in the storage format for `compression` (defaults to TEXT_COMPRESSION)."""
+    compression = compression or TEXT_COMPRESSION
+    if compression == "zlib":
+        payload = json.dumps(text, ensure_ascii=False).encode()
+        header = _DEFLATE_HEADER.pack(zlib.crc32(payload), len(payload) & 0xFFFFFFFF)
+        return bytes([MARKER_DEFLATE]) + header + _deflate(payload, final=False)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("TEXT_COMPRESSION=zstd requires the zstandard package")
+        return bytes([MARKER_ZSTD]) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(text.encode())
+    return text.encode()
+
+
+def decode_text(value: bytes) -> str:
+    """Decode a stored value back to text."""
+    if not value:
+        return "" if value is not None else None
+    marker = value[0]
+    if marker == MARKER_DEFLATE:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        payload = decompressor.decompress(value[1 + _DEFLATE_HEADER.size:]) + decompressor.flush()
+        return json.loads(payload)
+    if marker == MARKER_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Reading zstd-compressed text requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(value[1:]).decode()
+    return value.decode()
+
+
+def storage_format(value: bytes) -> str:
+    """Name of the storage format of a stored value ("none", "zlib" or "zstd")."""
+    if not value:
+        return "none"
+    return {MARKER_DEFLATE: "zlib", MARKER_ZSTD: "zstd"}.get(value[0], "none")
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored as bytes in one of the formats above."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode_text(value)
+
+
+# CRC-32 combination (port of zlib's crc32_combine), so a CRC can be computed
+# for spliced output without reading the stored payload
+def _gf2_matrix_times(matrix, vector):
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+
+def _gf2_matrix_square(matrix):
+    return [_gf2_matrix_times(matrix, matrix[n]) for n in range(32)]
+
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """CRC-32 of A+B given crc32(A), crc32(B) and len(B)."""
+    if len2 <= 0:
+        return crc1
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+    while True:
+        even = _gf2_matrix_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = _gf2_matrix_square(even)
+        if len2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+
+def gzip_json_with_stored_field(fields: dict, name: str, stored: bytes):
+    """
+    Build a gzip-encoded JSON object of `fields` plus `name` set to a deflate-format stored value.
+
+    The stored deflate stream is copied into the output without being decompressed.
+    Returns None when the value isn't stored in the deflate format.
+    """
+    if storage_format(stored) != "zlib":
+        return None
+    crc, length = _DEFLATE_HEADER.unpack_from(stored, 1)
+    body = stored[1 + _DEFLATE_HEADER.size:]
+
+    prefix = (json.dumps(fields, ensure_ascii=False)[:-1] + (", " if fields else "") + json.dumps(name) + ": ").encode()
+    suffix = b"}"
+
+    total_crc = zlib.crc32(prefix)
+    total_crc = crc32_combine(total_crc, crc, length)
+    total_crc = crc32_combine(total_crc, zlib.crc32(suffix), len(suffix))
+    total_length = (len(prefix) + length + len(suffix)) & 0xFFFFFFFF
+
+    return b"".join([
+        _GZIP_HEADER,
+        _deflate(prefix, final=False),
+        body,
+        _deflate(suffix, final=True),
+        _DEFLATE_HEADER.pack(total_crc, total_length),
+    ])
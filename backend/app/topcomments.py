@@ -0,0 +1,73 @@
+"""
+Cache of the first page of sorted comment listings ("top N comments").
+
+Hot albums and songs get their most-liked and newest comments requested far
+more often than anything else, so the first TOP_COMMENTS_N rows of those
+listings are kept per (comment model, entity id, sort) for TOP_COMMENTS_TTL
+seconds. The cache is a bounded LRU (TOP_COMMENTS_CACHE_SIZE entries), so it
+ends up holding the hottest entities. New comments drop the entity's entries
+in this process; like counts can be up to TOP_COMMENTS_TTL seconds stale.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+TOP_COMMENTS_N = int(os.getenv("TOP_COMMENTS_N", "50"))
+TOP_COMMENTS_TTL = float(os.getenv("TOP_COMMENTS_TTL", "30"))
+TOP_COMMENTS_CACHE_SIZE = int(os.getenv("TOP_COMMENTS_CACHE_SIZE", "1024"))
+
+# Sorts worth caching: the "most liked" and "newest" views
+CACHED_SORTS = ("-num_like", "-created")
+
+
+class TopCommentsCache:
+    """LRU of (rows, has_more) for the first page of a sorted comment listing."""
+
+    def __init__(self, max_entries: int = TOP_COMMENTS_CACHE_SIZE, ttl: float = TOP_COMMENTS_TTL,
+                 size: int = TOP_COMMENTS_N):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.size = size
+        self._entries: "OrderedDict[tuple, Tuple[float, List, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: tuple, load: Callable[[int], List]) -> Tuple[List, bool]:
+        """
+        Return the top `size` rows for `key` and whether more rows follow.
+
+        `load(n)` must return the first `n` rows of the listing.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] > now:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return cached[1], cached[2]
+            self.misses += 1
+
+        rows = load(self.size + 1)
+        has_more = len(rows) > self.size
+        rows = rows[:self.size]
+        with self._lock:
+            self._entries[key] = (now + self.ttl, rows, has_more)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rows, has_more
+
+    def invalidate(self, model, entity_id) -> None:
+        with self._lock:
+            for sort in CACHED_SORTS:
+                self._entries.pop((model, entity_id, sort), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+top_comments = TopCommentsCache()
@@ -0,0 +1,234 @@
+"""
+Bulk user import with password hashing spread across a process pool.
+
+bcrypt is CPU-bound, and one process can hash only a handful of passwords a
+second per core. The import therefore hashes plaintext passwords in a pool of
+USER_IMPORT_WORKERS processes (all cores by default) while the calling thread
+checks names and inserts finished chunks. Rows may instead carry an existing
+`password_hash`. Such a hash is stored as-is once passlib has parsed all of
+it as a bcrypt hash the app can verify, at no more than
+USER_IMPORT_MAX_HASH_ROUNDS rounds.
+
+Rows are handled in chunks of `chunk_size`. For each chunk, names already in
+the database (or earlier in the same import) are skipped before any hashing,
+so an interrupted import can simply be run again. The chunk is then split
+across the pool and inserted with one executemany and one commit. Up to
+USER_IMPORT_PIPELINE chunks are hashed ahead of the one being inserted, which
+keeps every worker busy.
+
+`run_import` runs an import from an async endpoint on a worker thread of its
+own, one import at a time, so a long import doesn't take one of the threads
+the sync endpoints share. The thread opens its own session rather than using
+the request's, since it can't be cancelled and may outlive the request.
+"""
+import collections
+import itertools
+import math
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Iterable, List, Optional
+
+import anyio
+from passlib.exc import PasslibHashWarning
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from . import crud
+from . import schemas
+from .utils import get_password_hash, pwd_context
+
+USER_IMPORT_WORKERS = int(os.getenv("USER_IMPORT_WORKERS", str(os.cpu_count() or 2)))
+USER_IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "1000"))
+USER_IMPORT_PIPELINE = int(os.getenv("USER_IMPORT_PIPELINE", "2"))
+# Each extra round doubles the cost of verifying the hash at every login
+USER_IMPORT_MAX_HASH_ROUNDS = int(os.getenv("USER_IMPORT_MAX_HASH_ROUNDS", "14"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_import_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash a slice of passwords; runs in a pool process."""
+    return [get_password_hash(password) for password in passwords]
+
+
+def is_password_hash(value: str) -> bool:
+    """True if `value` is a complete, well-formed hash in a scheme `verify_password` accepts."""
+    try:
+        scheme = pwd_context.identify(value, required=False)
+        if scheme is None:
+            return False
+        # identify() only checks the prefix; from_string() parses the whole hash.
+        # Padding bit warnings become errors in passlib 2.0, so reject those too
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", PasslibHashWarning)
+            parsed = pwd_context.handler(scheme).from_string(value)
+    except (TypeError, ValueError, PasslibHashWarning):
+        return False
+    return getattr(parsed, "rounds", 0) <= USER_IMPORT_MAX_HASH_ROUNDS
+
+
+def hash_pool() -> ProcessPoolExecutor:
+    """The shared hashing pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process has threads running
+            _pool = ProcessPoolExecutor(
+                max_workers=USER_IMPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+class _Chunk:
+    """A chunk of rows that survived validation, with its hashing in flight."""
+
+    def __init__(self, rows: List[dict], to_hash: List[int], futures: list):
+        self.rows = rows
+        self.to_hash = to_hash
+        self.futures = futures
+
+    def ready_rows(self) -> List[dict]:
+        hashes = itertools.chain.from_iterable(future.result() for future in self.futures)
+        for i, hashed in zip(self.to_hash, hashes):
+            self.rows[i]["password"] = hashed
+        return self.rows
+
+
+def _row_values(user: schemas.UserImportItem, password: str) -> dict:
+    return {
+        "user_name": user.user_name,
+        "password": password,
+        "location": user.location,
+        "age": user.age,
+        "gender": user.gender,
+        "constellation": user.constellation,
+        "play_count": user.play_count,
+        "join_time": user.join_time or date.today(),
+    }
+
+
+def import_users(db: Session, users: Iterable, chunk_size: int = USER_IMPORT_CHUNK_SIZE,
+                 executor: Optional[ProcessPoolExecutor] = None, workers: int = USER_IMPORT_WORKERS,
+                 on_progress=None) -> dict:
+    """
+    Import `users` (UserImportItem objects or plain dicts) and return a report
+    matching `schemas.UserImportResult`.
+
+    `workers` is the number of processes in `executor` (the shared pool's by
+    default); each chunk is split that many ways. `on_progress(report)` is
+    called after each chunk is inserted.
+    """
+    executor = executor or hash_pool()
+    report = {"imported": 0, "skipped_existing": 0, "hashed": 0, "prehashed": 0, "rejected": []}
+    seen = set()
+    pending = collections.deque()
+    started = time.perf_counter()
+
+    def reject(index, user_name, reason):
+        report["rejected"].append({"index": index, "user_name": user_name, "reason": reason})
+
+    def prepare(batch) -> _Chunk:
+        users = []
+        for index, user in batch:
+            if not isinstance(user, schemas.UserImportItem):
+                try:
+                    user = schemas.UserImportItem.model_validate(user)
+                except ValidationError as e:
+                    name = user.get("user_name", "") if isinstance(user, dict) else ""
+                    reject(index, str(name), e.errors()[0]["msg"])
+                    continue
+            if (user.password is None) == (user.password_hash is None):
+                reject(index, user.user_name, "Exactly one of password and password_hash is required")
+            elif user.password_hash is not None and not is_password_hash(user.password_hash):
+                reject(index, user.user_name,
+                       f"Invalid password hash (expected bcrypt, at most {USER_IMPORT_MAX_HASH_ROUNDS} rounds)")
+            elif user.user_name in seen:
+                report["skipped_existing"] += 1
+            else:
+                seen.add(user.user_name)
+                users.append(user)
+
+        existing = crud.get_existing_user_names(db, [user.user_name for user in users])
+        report["skipped_existing"] += len(existing)
+        rows, to_hash, passwords = [], [], []
+        for user in users:
+            if user.user_name in existing:
+                continue
+            if user.password_hash is not None:
+                rows.append(_row_values(user, user.password_hash))
+                report["prehashed"] += 1
+            else:
+                to_hash.append(len(rows))
+                passwords.append(user.password)
+                rows.append(_row_values(user, ""))
+
+        # Spread the chunk over every worker
+        step = max(1, math.ceil(len(passwords) / workers))
+        futures = [executor.submit(hash_passwords, passwords[i:i + step])
+                   for i in range(0, len(passwords), step)]
+        return _Chunk(rows, to_hash, futures)
+
+    def insert(chunk: _Chunk):
+        rows = chunk.ready_rows()
+        report["hashed"] += len(chunk.to_hash)
+        inserted = crud.insert_users(db, rows)
+        report["imported"] += len(inserted)
+        report["skipped_existing"] += len(rows) - len(inserted)
+        if on_progress is not None:
+            on_progress(report)
+
+    try:
+        numbered = enumerate(users)
+        while True:
+            batch = list(itertools.islice(numbered, chunk_size))
+            if not batch:
+                break
+            pending.append(prepare(batch))
+            if len(pending) > USER_IMPORT_PIPELINE:
+                insert(pending.popleft())
+        while pending:
+            insert(pending.popleft())
+    finally:
+        for chunk in pending:
+            for future in chunk.futures:
+                future.cancel()
+
+    report["seconds"] = time.perf_counter() - started
+    report["users_per_second"] = report["imported"] / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+
+def _import_in_own_session(bind, users: Iterable) -> dict:
+    db = Session(bind=bind, autoflush=False)
+    try:
+        return import_users(db, users)
+    finally:
+        db.close()
+
+
+async def run_import(db: Session, users: Iterable) -> dict:
+    """
+    import_users on a thread outside the shared threadpool, in a session of
+    its own on `db`'s engine; concurrent imports wait their turn.
+    """
+    global _import_limiter
+    if _import_limiter is None:
+        _import_limiter = anyio.CapacityLimiter(1)
+    return await anyio.to_thread.run_sync(_import_in_own_session, db.get_bind(), users,
+                                          limiter=_import_limiter)
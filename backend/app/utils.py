@@ -1,5 +1,11 @@
-from datetime import datetime, timedelta
-from typing import Optional
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import unicodedata
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
@@ -15,6 +21,7 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY", "thisissecretkey")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
 
 def convert_datetime_to_iso8601(dt: datetime) -> str:
@@ -26,6 +33,44 @@ def convert_datetime_to_iso8601(dt: datetime) -> str:
     return dt.isoformat()
 
 
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last row on a page as an opaque keyset cursor."""
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, types: Optional[Sequence[type]] = None) -> List:
+    """
+    Decode a keyset cursor produced by encode_cursor. Raises ValueError if it is malformed.
+
+    With `types` (one of str, int, date or datetime per sort key), the cursor
+    must hold exactly one value of that type per key; dates are parsed back
+    from their ISO form.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    if types is None:
+        return values
+    if len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    return [_cursor_value(value, value_type) for value, value_type in zip(values, types)]
+
+
+def _cursor_value(value, value_type: type):
+    if value_type in (date, datetime):
+        if not isinstance(value, str):
+            raise ValueError("Invalid cursor")
+        return value_type.fromisoformat(value)
+    # bool is an int subclass, but never a valid key value
+    if not isinstance(value, value_type) or isinstance(value, bool):
+        raise ValueError("Invalid cursor")
+    return value
+
+
 def verify_password(plain_password, hashed_password):
     """Verify a password against a hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -46,3 +91,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+def collation_key(value):
+    """
+    Key under which MySQL's default case- and accent-insensitive collation
+    treats strings as equal: accents stripped, case folded, trailing spaces
+    ignored. Non-string values are returned unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().rstrip(" ")
+
+
+def key_normalizer(db):
+    """Return `collation_key` when the session is bound to MySQL, else None (keys compare exactly)."""
+    return collation_key if db.get_bind().dialect.name == "mysql" else None
+
+
+def generate_refresh_nonce() -> str:
+    """Random per-login value the refresh token signatures of that login are derived from."""
+    return secrets.token_urlsafe(32)
+
+
+def sign_refresh_token(token_id: int, generation: int, nonce: str) -> str:
+    """Signature part of a refresh token: HMAC of its login row id, generation and the row's nonce."""
+    return hmac.new(SECRET_KEY.encode(), f"{token_id}.{generation}.{nonce}".encode(), hashlib.sha256).hexdigest()
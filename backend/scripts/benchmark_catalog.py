@@ -0,0 +1,83 @@
+# scripts/benchmark_catalog.py
+import argparse
+import gc
+import time
+import tracemalloc
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Find the .env file - It should be in the backend directory
+script_path = Path(__file__)
+backend_dir = script_path.parent.parent  # Go up two levels: scripts/ -> backend/
+env_path = backend_dir / '.env'
+
+# Load the environment variables
+load_dotenv(dotenv_path=env_path)
+
+from ..app.database import SessionLocal
+from ..app import crud
+from ..app.catalog import CatalogSnapshot
+
+
+def _throughput(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed if elapsed else float("inf")
+
+
+def benchmark_catalog(iterations=1000):
+    """Compare catalog reads served by the in-memory snapshot against the database path."""
+    session = SessionLocal()
+    try:
+        # Memory footprint of the snapshot
+        tracemalloc.start()
+        snapshot = CatalogSnapshot()
+        snapshot.load(session)
+        # Drop the ORM instances used while loading so only the snapshot is counted
+        session.expunge_all()
+        gc.collect()
+        snapshot_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rows = len(snapshot.genres) + len(snapshot.artists) + len(snapshot.albums) + len(snapshot.songs)
+        print(f"Snapshot rows: {rows}")
+        if rows:
+            print(f"Snapshot memory: {snapshot_bytes / 1024:.1f} KiB ({snapshot_bytes / rows:.0f} bytes/row)")
+
+        album_id = snapshot.albums.keys[0] if len(snapshot.albums) else ""
+        song_id = snapshot.songs.keys[0] if len(snapshot.songs) else ""
+
+        cases = [
+            ("get_albums(limit=100)",
+             lambda: crud.get_albums(session, skip=0, limit=100),
+             lambda: snapshot.get_albums(skip=0, limit=100)),
+            ("get_songs_by_album",
+             lambda: crud.get_songs_by_album(session, album_id=album_id),
+             lambda: snapshot.get_songs_by_album(album_id=album_id)),
+            ("get_song",
+             lambda: session.query(crud.models.Song).filter(crud.models.Song.song_id == song_id).first(),
+             lambda: snapshot.get_song(song_id=song_id)),
+        ]
+
+        print(f"\n{'read':<25}{'database/s':>14}{'snapshot/s':>14}{'speedup':>10}")
+        for name, db_read, snapshot_read in cases:
+            db_rate = _throughput(db_read, iterations)
+            snapshot_rate = _throughput(snapshot_read, iterations)
+            print(f"{name:<25}{db_rate:>14.0f}{snapshot_rate:>14.0f}{snapshot_rate / db_rate:>9.1f}x")
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the in-memory catalog snapshot against the database')
+    parser.add_argument('--iterations', type=int, default=1000,
+                        help='Reads per case')
+    args = parser.parse_args()
+
+    benchmark_catalog(iterations=args.iterations)
+
+
+if __name__ == "__main__":
+    main()
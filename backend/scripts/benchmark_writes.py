@@ -0,0 +1,108 @@
+# scripts/benchmark_writes.py
+import argparse
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+# Find the .env file - It should be in the backend directory
+script_path = Path(__file__)
+backend_dir = script_path.parent.parent  # Go up two levels: scripts/ -> backend/
+env_path = backend_dir / '.env'
+
+# Load the environment variables
+load_dotenv(dotenv_path=env_path)
+
+from ..app.database import SessionLocal, engine
+from ..app import crud, models, schemas
+
+BENCHMARK_COMMENT = "benchmark_writes"
+
+
+def _legacy_create_song_comment(db, comment):
+    """The previous write path: existence pre-check, add, commit, refresh."""
+    if db.query(models.Song).filter(models.Song.song_id == comment.song_id).first() is None:
+        raise LookupError("Song not found")
+    db_comment = models.SongComment(
+        song_id=comment.song_id,
+        comment=comment.comment,
+        num_like=comment.num_like,
+        user_id=comment.user_id,
+        star=comment.star
+    )
+    db.add(db_comment)
+    db.commit()
+    db.refresh(db_comment)
+    return db_comment
+
+
+def _run(create, song_id, user_id, iterations):
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    session = SessionLocal()
+    try:
+        comment = schemas.SongCommentCreate(
+            song_id=song_id, user_id=user_id, comment=BENCHMARK_COMMENT, star=5
+        )
+        start = time.perf_counter()
+        for _ in range(iterations):
+            # A fresh session per create, like one request each
+            session.close()
+            create(session, comment)
+        elapsed = time.perf_counter() - start
+    finally:
+        session.close()
+        event.remove(engine, "before_cursor_execute", count)
+    return iterations / elapsed if elapsed else float("inf"), statements / iterations
+
+
+def benchmark_writes(iterations=500, song_id=None, user_id=None):
+    """Compare comment creation throughput of the old and current write paths."""
+    session = SessionLocal()
+    try:
+        song_id = song_id or session.query(models.Song.song_id).limit(1).scalar()
+        user_id = user_id or session.query(models.User.id).limit(1).scalar()
+    finally:
+        session.close()
+    if song_id is None or user_id is None:
+        print("❌ Need at least one song and one user in the database.")
+        return
+
+    print(f"Creating {iterations} comments per path on song {song_id} as user {user_id}")
+    print(f"\n{'path':<30}{'creates/s':>12}{'statements':>12}")
+    try:
+        for name, create in [
+            ("pre-check + add/commit/refresh", _legacy_create_song_comment),
+            ("crud.create_song_comment", crud.create_song_comment),
+        ]:
+            rate, per_create = _run(create, song_id, user_id, iterations)
+            print(f"{name:<30}{rate:>12.0f}{per_create:>12.1f}")
+    finally:
+        session = SessionLocal()
+        try:
+            session.query(models.SongComment).filter(
+                models.SongComment.comment == BENCHMARK_COMMENT
+            ).delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark comment creation throughput')
+    parser.add_argument('--iterations', type=int, default=500,
+                        help='Comments created per path')
+    parser.add_argument('--song-id', help='Song to comment on (defaults to the first song)')
+    parser.add_argument('--user-id', type=int, help='Commenting user (defaults to the first user)')
+    args = parser.parse_args()
+
+    benchmark_writes(iterations=args.iterations, song_id=args.song_id, user_id=args.user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# scripts/compress_text.py
+import argparse
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import LargeBinary, bindparam, type_coerce, update
+
+# Find the .env file - It should be in the backend directory
+script_path = Path(__file__)
+backend_dir = script_path.parent.parent  # Go up two levels: scripts/ -> backend/
+env_path = backend_dir / '.env'
+
+# Load the environment variables
+load_dotenv(dotenv_path=env_path)
+
+from ..app.database import SessionLocal
+from ..app.models import SongMeta, ArtistMeta, AlbumMeta
+from ..app.textstore import decode_text, encode_text, storage_format
+
+# (model, primary key column, text column)
+TEXT_COLUMNS = [
+    (SongMeta, SongMeta.song_id, SongMeta.lyrics),
+    (ArtistMeta, ArtistMeta.artist_id, ArtistMeta.info),
+    (AlbumMeta, AlbumMeta.album_id, AlbumMeta.info),
+]
+
+
+def _rewrite(value: bytes, target: str) -> bytes:
+    return encode_text(decode_text(value), target)
+
+
+def compress_text(target="zlib", batch_size=500, pause=0.0):
+    """
+    Rewrite stored meta text into the `target` format in small batches.
+
+    Rows are walked in primary key order and each batch is committed on its
+    own, so the tables stay available while this runs. `none` writes plain
+    UTF-8, which is also what downgrading migration 005 needs.
+    """
+    session = SessionLocal()
+    try:
+        for model, key_column, text_column in TEXT_COLUMNS:
+            table = model.__table__
+            raw_column = type_coerce(text_column, LargeBinary)
+            print(f"Rewriting {table.name}.{text_column.key} to {target}...")
+            last_key = None
+            rewritten = 0
+            bytes_before = 0
+            bytes_after = 0
+            started = time.perf_counter()
+
+            while True:
+                query = session.query(key_column, raw_column.label("value")).order_by(key_column)
+                if last_key is not None:
+                    query = query.filter(key_column > last_key)
+                rows = query.limit(batch_size).all()
+                if not rows:
+                    break
+                last_key = rows[-1][0]
+
+                updates = []
+                for key, value in rows:
+                    if value is None or storage_format(value) == target:
+                        continue
+                    new_value = _rewrite(value, target)
+                    bytes_before += len(value)
+                    bytes_after += len(new_value)
+                    updates.append({"key": key, "value": new_value})
+
+                if updates:
+                    # executemany with the raw binary value, bypassing CompressedText
+                    stmt = update(table).where(
+                        table.c[key_column.key] == bindparam("key")
+                    ).values({text_column.key: bindparam("value", type_=LargeBinary)})
+                    session.connection().execute(stmt, updates)
+                    session.commit()
+                    rewritten += len(updates)
+                else:
+                    session.rollback()
+
+                if pause:
+                    time.sleep(pause)
+
+            elapsed = time.perf_counter() - started
+            print(f"  {rewritten} rows rewritten in {elapsed:.1f}s "
+                  f"({bytes_before} -> {bytes_after} bytes)")
+
+        print("✅ Text rewrite complete.")
+    except Exception as e:
+        print(f"❌ Error rewriting text: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompress stored lyrics and bios')
+    parser.add_argument('--format', choices=['zlib', 'zstd', 'none'], default='zlib',
+                        help='Target storage format')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='Rows per transaction')
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help='Seconds to sleep between batches')
+    args = parser.parse_args()
+
+    compress_text(target=args.format, batch_size=args.batch_size, pause=args.pause)
+
+
+if __name__ == "__main__":
+    main()
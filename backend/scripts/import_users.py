@@ -0,0 +1,69 @@
+# scripts/import_users.py
+import argparse
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Find the .env file - It should be in the backend directory
+script_path = Path(__file__)
+backend_dir = script_path.parent.parent  # Go up two levels: scripts/ -> backend/
+env_path = backend_dir / '.env'
+
+# Load the environment variables
+load_dotenv(dotenv_path=env_path)
+
+from ..app.database import SessionLocal
+from ..app.userimport import USER_IMPORT_CHUNK_SIZE, USER_IMPORT_WORKERS, import_users
+
+
+def read_users(path):
+    """Yield user dicts from a CSV file with a header row, or from a JSON lines file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                # Empty CSV cells mean "not given", not an empty password
+                yield {key: value for key, value in row.items() if value != ""}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import users, hashing plaintext passwords on every core')
+    parser.add_argument('path', help='CSV (with header) or JSON lines file of users; each row has '
+                                     'password or an existing bcrypt password_hash')
+    parser.add_argument('--chunk-size', type=int, default=USER_IMPORT_CHUNK_SIZE, help='Rows per insert')
+    parser.add_argument('--workers', type=int, default=USER_IMPORT_WORKERS, help='Hashing processes')
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    started = time.perf_counter()
+
+    def progress(report):
+        elapsed = time.perf_counter() - started
+        print(f"  {report['imported']} imported, {report['skipped_existing']} skipped, "
+              f"{len(report['rejected'])} rejected ({report['imported'] / elapsed:.0f} users/s)")
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            report = import_users(session, read_users(args.path), chunk_size=args.chunk_size,
+                                  executor=executor, workers=args.workers, on_progress=progress)
+    finally:
+        session.close()
+
+    print(f"Imported {report['imported']} users in {report['seconds']:.1f}s "
+          f"({report['users_per_second']:.0f} users/s, {args.workers} workers)")
+    print(f"  {report['hashed']} passwords hashed, {report['prehashed']} pre-hashed, "
+          f"{report['skipped_existing']} already existed")
+    if report["rejected"]:
+        print(f"  {len(report['rejected'])} rejected, first ones:")
+        for rejection in report["rejected"][:10]:
+            print(f"    row {rejection['index']} ({rejection['user_name']}): {rejection['reason']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# scripts/load_test_likes.py
+import argparse
+import asyncio
+import time
+
+from .loadgen import build_request, connect, send
+
+
+async def _client(url, requests, counts):
+    """One keep-alive connection sending its like requests back to back."""
+    reader, writer, _ = await connect(url)
+    try:
+        for request in requests:
+            status = await send(reader, writer, request)
+            if status is None:
+                counts["errors"] += 1
+                return
+            if status == 200:
+                counts["ok"] += 1
+            else:
+                counts["errors"] += 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        counts["errors"] += 1
+    finally:
+        writer.close()
+
+
+async def load_test_likes(url, comment_type, comment_id, tokens, clients=1000):
+    """
+    Like one comment once per access token, from `clients` concurrent connections.
+
+    A user can like a comment only once, so every token should belong to a
+    different user that hasn't liked the comment yet.
+    """
+    _, writer, host = await connect(url)
+    writer.close()
+    requests = [
+        build_request("POST", f"/comments/{comment_type}/{comment_id}/like", host,
+                      extra_headers={"Authorization": f"Bearer {token}"})
+        for token in tokens
+    ]
+    clients = max(min(clients, len(requests)), 1)
+
+    counts = {"ok": 0, "errors": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*[_client(url, requests[i::clients], counts) for i in range(clients)])
+    elapsed = time.perf_counter() - started
+
+    print(f"{clients} clients, {elapsed:.1f}s")
+    print(f"  {counts['ok']} likes accepted ({counts['ok'] / elapsed:.0f} likes/s), {counts['errors']} errors")
+    print(f"  expected num_like increase: at most {counts['ok']} (users who had liked it already add nothing)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the comment like endpoint')
+    parser.add_argument('--url', default='http://localhost:8000', help='Base URL of a running server')
+    parser.add_argument('--comment-type', choices=['song', 'artist', 'album'], default='song')
+    parser.add_argument('--comment-id', type=int, required=True)
+    parser.add_argument('--tokens-file', required=True,
+                        help='File with one access token per line, one per liking user')
+    parser.add_argument('--clients', type=int, default=1000, help='Concurrent connections')
+    args = parser.parse_args()
+
+    with open(args.tokens_file) as f:
+        tokens = [line.strip() for line in f if line.strip()]
+    asyncio.run(load_test_likes(args.url, args.comment_type, args.comment_id, tokens, clients=args.clients))
+
+
+if __name__ == "__main__":
+    main()
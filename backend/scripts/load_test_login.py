@@ -0,0 +1,88 @@
+# scripts/load_test_login.py
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from .loadgen import build_request, connect, send
+
+
+async def _probe(url, path, deadline):
+    """Request a non-auth endpoint back to back on one connection; returns latencies in seconds."""
+    reader, writer, host = await connect(url)
+    request = build_request("GET", path, host)
+    latencies = []
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await send(reader, writer, request)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+    return latencies
+
+
+async def _login_client(url, request, deadline, statuses):
+    reader, writer, _ = await connect(url)
+    try:
+        while time.perf_counter() < deadline:
+            status = await send(reader, writer, request)
+            statuses[status] += 1
+            if status is None:
+                return
+            if status == 503:
+                await asyncio.sleep(0.05)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        statuses["error"] += 1
+    finally:
+        writer.close()
+
+
+def _summary(latencies):
+    if not latencies:
+        return "no samples"
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f"{len(ordered)} requests, p50 {statistics.median(ordered) * 1000:.1f} ms, "
+            f"p95 {p95 * 1000:.1f} ms, max {ordered[-1] * 1000:.1f} ms")
+
+
+async def load_test_login(url, username, password, login_clients=200, duration=10.0, probe_path="/"):
+    """Measure non-auth latency alone, then during a storm of /token logins."""
+    _, writer, host = await connect(url)
+    writer.close()
+    body = urlencode({"username": username, "password": password}).encode()
+    login_request = build_request("POST", "/token", host, body, "application/x-www-form-urlencoded")
+
+    baseline = await _probe(url, probe_path, time.perf_counter() + duration / 2)
+    print(f"{probe_path} alone:        {_summary(baseline)}")
+
+    statuses = Counter()
+    deadline = time.perf_counter() + duration
+    results = await asyncio.gather(
+        _probe(url, probe_path, deadline),
+        *[_login_client(url, login_request, deadline, statuses) for _ in range(login_clients)]
+    )
+    print(f"{probe_path} during storm: {_summary(results[0])}")
+    print(f"logins ({login_clients} clients): " + ", ".join(f"{status}: {count}" for status, count in sorted(
+        statuses.items(), key=lambda item: str(item[0]))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that non-auth latency stays flat during a login storm')
+    parser.add_argument('--url', default='http://localhost:8000', help='Base URL of a running server')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--login-clients', type=int, default=200, help='Concurrent login connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of login storm')
+    parser.add_argument('--probe-path', default='/', help='Non-auth endpoint to time')
+    args = parser.parse_args()
+
+    asyncio.run(load_test_login(args.url, args.username, args.password, login_clients=args.login_clients,
+                                duration=args.duration, probe_path=args.probe_path))
+
+
+if __name__ == "__main__":
+    main()
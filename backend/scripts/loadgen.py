@@ -0,0 +1,41 @@
+# scripts/loadgen.py
+"""Minimal keep-alive HTTP/1.1 client on asyncio streams, shared by the load test scripts."""
+import asyncio
+from urllib.parse import urlsplit
+
+
+async def connect(url):
+    """Open a connection to the server of `url`; returns (reader, writer, host header)."""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    return reader, writer, parts.netloc
+
+
+def build_request(method, path, host, body=b"", content_type=None, extra_headers=None):
+    headers = [f"{method} {path} HTTP/1.1", f"Host: {host}"]
+    if content_type:
+        headers.append(f"Content-Type: {content_type}")
+    for name, value in (extra_headers or {}).items():
+        headers.append(f"{name}: {value}")
+    if body or method in ("POST", "PUT", "PATCH"):
+        headers.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + body
+
+
+async def send(reader, writer, request):
+    """Send a prepared request and read the whole response; returns the status code, or None if the server closed."""
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        return None
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
@@ -0,0 +1,44 @@
+"""
+Response compression: routes marked with `uncompressed` are sent as-is.
+"""
+import os
+import sys
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.compression import CompressionMiddleware, uncompressed  # noqa: E402
+
+BODY = "compressible " * 200
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/compressed", response_class=PlainTextResponse)
+    def compressed():
+        return BODY
+
+    @app.get("/raw", response_class=PlainTextResponse)
+    @uncompressed
+    def raw():
+        return BODY
+
+    return TestClient(app)
+
+
+def test_regular_route_is_compressed():
+    response = make_client().get("/compressed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == BODY
+
+
+def test_uncompressed_route_is_sent_as_is():
+    response = make_client().get("/raw", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-length"] == str(len(BODY))
+    assert response.text == BODY
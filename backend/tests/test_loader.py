@@ -0,0 +1,59 @@
+"""
+Tests for the request-scoped row loader. Runs against in-memory SQLite, so no
+MySQL server is needed.
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.database builds its (unused here) MySQL URL from these at import time
+for name, value in (("DB_HOST", "localhost"), ("DB_PORT", "3306"), ("DB_NAME", "test")):
+    os.environ.setdefault(name, value)
+
+from app import models  # noqa: E402
+from app.loader import RequestLoader  # noqa: E402
+from app.utils import collation_key  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add_all([models.Artist(artist_id="abc", name="A", region="UK"),
+                     models.Artist(artist_id="def", name="D", region="US")])
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def count_statements(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_hits_and_misses_are_memoized(db):
+    loader = RequestLoader(db)
+    statements = count_statements(db)
+    assert [row and row.artist_id for row in loader.load_many(models.Artist, ["abc", "def", "zzz"])] == \
+        ["abc", "def", None]
+    assert loader.load(models.Artist, "abc").name == "A"
+    assert loader.load(models.Artist, "zzz") is None
+    assert len(statements) == 1, statements
+
+
+def test_normalized_keys_map_back_to_requested_keys(db):
+    # SQLite compares exactly, so look up the stored spelling as well; MySQL would return it for "ABC " alone
+    loader = RequestLoader(db, collation_key)
+    rows = loader.load_many(models.Artist, ["ABC ", "abc", "zzz"])
+    assert [row and row.artist_id for row in rows] == ["abc", "abc", None]
+    assert loader.load(models.Artist, "ABC ").artist_id == "abc"
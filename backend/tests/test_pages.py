@@ -0,0 +1,106 @@
+"""
+Query-count regression tests for the composite page loaders.
+
+The album and artist pages must load with a fixed number of statements no
+matter how many songs, albums, genres or comments they show. Runs against
+in-memory SQLite, so no MySQL server is needed.
+"""
+import datetime
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.database builds its (unused here) MySQL URL from these at import time
+for name, value in (("DB_HOST", "localhost"), ("DB_PORT", "3306"), ("DB_NAME", "test")):
+    os.environ.setdefault(name, value)
+
+from app import crud, models, schemas  # noqa: E402
+
+ALBUM_PAGE_STATEMENTS = 6
+ARTIST_PAGE_STATEMENTS = 5
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def seed(db, albums, songs_per_album, comments):
+    genres = [models.Genre(id=i, name=f"Genre{i}", info="genre info " * 50) for i in range(1, 4)]
+    artist = models.Artist(artist_id="ar1", name="Band", region="UK")
+    guest = models.Artist(artist_id="ar2", name="Guest", region="US")
+    user = models.User(id=1, user_name="u", password="x", location="l", age=1, gender="g",
+                       constellation="c", play_count=0)
+    db.add_all(genres + [artist, guest, user])
+    db.flush()
+    artist.genres.extend(genres)
+    db.add(models.ArtistMeta(artist_id="ar1", info="bio " * 300, pic_address="p"))
+    for a in range(albums):
+        album = models.Album(album_id=f"al{a}", name=f"Album{a}", artist_id="ar1", album_lan="en",
+                             release_date=datetime.date(2000 + a, 1, 1), album_category="LP", record_label="L")
+        album.genres.extend(genres)
+        db.add(album)
+        db.flush()
+        db.add(models.AlbumMeta(album_id=album.album_id, info="album info " * 100, pic_address="p"))
+        for s in range(songs_per_album):
+            song = models.Song(song_id=f"s{a}-{s}", name=f"Song{s}", order=s, album_id=album.album_id)
+            song.artists.append(artist)
+            if s % 2:
+                song.artists.append(guest)
+            db.add(song)
+            db.flush()
+            for c in range(comments):
+                db.add(models.SongComment(song_id=song.song_id, comment=f"c{c}", num_like=c, user_id=1, star=1 + c % 5))
+        for c in range(comments):
+            db.add(models.AlbumComment(album_id=album.album_id, comment=f"a{c}", num_like=c, user_id=1, star=10 * (1 + c % 10)))
+    for c in range(comments):
+        db.add(models.ArtistComment(artist_id="ar1", comment=f"r{c}", num_like=c, user_id=1))
+    db.commit()
+
+
+def count_statements(db, load):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        page = load()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    db.expunge_all()
+    return page, statements
+
+
+@pytest.mark.parametrize("songs_per_album,comments", [(1, 1), (12, 30)])
+def test_album_page_statement_count(db, songs_per_album, comments):
+    seed(db, albums=2, songs_per_album=songs_per_album, comments=comments)
+    page, statements = count_statements(db, lambda: crud.get_album_page(db, "al0"))
+    assert len(page["songs"]) == songs_per_album
+    assert [genre.summary for genre in page["genres"]] == [("genre info " * 50)[:schemas.GENRE_SUMMARY_LENGTH]] * 3
+    assert len(page["comments"]) == comments
+    assert len(statements) == ALBUM_PAGE_STATEMENTS, statements
+
+
+@pytest.mark.parametrize("albums,comments", [(1, 1), (8, 30)])
+def test_artist_page_statement_count(db, albums, comments):
+    seed(db, albums=albums, songs_per_album=3, comments=comments)
+    page, statements = count_statements(db, lambda: crud.get_artist_page(db, "ar1"))
+    assert len(page["albums"]) == albums
+    assert [genre.summary for genre in page["genres"]] == [("genre info " * 50)[:schemas.GENRE_SUMMARY_LENGTH]] * 3
+    assert len(page["comments"]) == comments
+    assert len(statements) == ARTIST_PAGE_STATEMENTS, statements
@@ -0,0 +1,36 @@
+"""
+Guards the anyio internals the request profiler relies on to find the
+worker thread running a request's sync code.
+"""
+import asyncio
+import os
+import sys
+import threading
+
+import anyio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import profiling  # noqa: E402
+
+
+def test_worker_thread_is_attributed_to_its_request():
+    async def main():
+        session = profiling._Session(asyncio.get_running_loop(), asyncio.current_task(),
+                                     threading.get_ident(), 0.001)
+        other = profiling._Session(asyncio.get_running_loop(), asyncio.current_task(),
+                                   threading.get_ident(), 0.001)
+
+        def job():
+            # Fails if anyio's worker no longer runs jobs from a `run` frame with a `context` local
+            frame = sys._getframe()
+            return (session._works_for_request(threading.get_ident(), frame),
+                    other._works_for_request(threading.get_ident(), frame))
+
+        token = profiling._current_session.set(session)
+        try:
+            return await anyio.to_thread.run_sync(job)
+        finally:
+            profiling._current_session.reset(token)
+
+    assert asyncio.run(main()) == (True, False)
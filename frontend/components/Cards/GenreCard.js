@@ -18,7 +18,7 @@ const GenreCard = ({ genre }) => {
             <Heading size="sm" mb={1}>{genre.name}</Heading>
           </LinkOverlay>
         </NextLink>
-        <Text fontSize="xs" noOfLines={2}>{genre.info}</Text>
+        <Text fontSize="xs" noOfLines={2}>{genre.summary ?? genre.info}</Text>
       </Box>
     </LinkBox>
   );